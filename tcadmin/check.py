@@ -13,6 +13,14 @@ from .options import with_options, check_options
 
 
 check_options.add(click.argument("pytest_options", nargs=-1))
+check_options.add(
+    click.option(
+        "--processes",
+        type=int,
+        default=None,
+        help="number of worker processes checks should use to expand scopes",
+    )
+)
 
 
 @with_options("pytest_options")
@@ -9,17 +9,29 @@ from ..resources import Resources
 from . import hooks, clients, roles, worker_pools, secrets
 
 
+# fetchers for each kind of resource, keyed by the prefix of that kind's ids
+FETCHERS = [
+    ("Client=", clients.fetch_clients),
+    ("Role=", roles.fetch_roles),
+    ("Hook=", hooks.fetch_hooks),
+    ("WorkerPool=", worker_pools.fetch_worker_pools),
+    ("Secret=", secrets.fetch_secrets),
+]
+
+
 async def resources(managed):
     """
     Fetch the existing resources that are managed by the provided list.
+    Kinds of resources that cannot match any of the managed patterns are not
+    fetched at all.
     """
     resources = Resources([], managed)
 
     await asyncio.gather(
-        clients.fetch_clients(resources),
-        roles.fetch_roles(resources),
-        hooks.fetch_hooks(resources),
-        worker_pools.fetch_worker_pools(resources),
-        secrets.fetch_secrets(resources),
+        *(
+            fetch(resources)
+            for prefix, fetch in FETCHERS
+            if resources.managed.could_match(prefix)
+        )
     )
     return resources
@@ -4,6 +4,8 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file, You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 
+import asyncio
+
 from taskcluster.aio import Auth
 
 from ..resources import Client
@@ -13,15 +15,23 @@ from ..util.taskcluster import tcClientOptions
 
 async def fetch_clients(resources):
     auth = Auth(await tcClientOptions(), session=aiohttp_session())
-    query = {}
-    while True:
-        res = await auth.listClients(query=query)
-        for clients in res["clients"]:
-            client = Client.from_api(clients)
-            if resources.is_managed(client.id):
-                resources.add(client)
-
-        if "continuationToken" in res:
-            query["continuationToken"] = res["continuationToken"]
-        else:
-            break
+
+    async def fetch_prefix(prefix):
+        query = {"prefix": prefix} if prefix else {}
+        while True:
+            res = await auth.listClients(query=query)
+            for clients in res["clients"]:
+                client = Client.from_api(clients)
+                if resources.is_managed(client.id):
+                    resources.add(client)
+
+            if "continuationToken" in res:
+                query["continuationToken"] = res["continuationToken"]
+            else:
+                break
+
+    # list only clients with prefixes that could be managed, concurrently; the
+    # prefixes are disjoint, so no client is listed twice
+    await asyncio.gather(
+        *(fetch_prefix(prefix) for prefix in resources.managed.prefixes("Client="))
+    )
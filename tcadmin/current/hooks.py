@@ -16,9 +16,7 @@ async def fetch_hooks(resources):
     for hookGroupId in (await hooks.listHookGroups())["groups"]:
         idPrefix = "Hook={}/".format(hookGroupId)
         # if no hook with this hookGroupId is managed, skip it
-        is_managed = any(m.startswith(idPrefix) for m in resources.managed)
-        is_managed = is_managed or resources.is_managed(idPrefix)
-        if not is_managed:
+        if not resources.managed.could_match(idPrefix):
             continue
         for hook in (await hooks.listHooks(hookGroupId))["hooks"]:
             hook = Hook.from_api(hook)
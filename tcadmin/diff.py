@@ -6,47 +6,20 @@
 
 import re
 import click
+import textwrap
 import blessings
 import attr
-import subprocess
 from collections import defaultdict
-from tempfile import NamedTemporaryFile
 
 from .util.ansi import strip_ansi
-from .resources import Resources
+from .util.unidiff import unified_diff
+from .util.scopes import Resolver, expand_all
+from .resources import Role, Client, Secret
 from .options import with_options, diff_options
 
 t = blessings.Terminal()
 
 
-def fast_diff(left, right, n, minimal):
-    with NamedTemporaryFile("w") as left_file, NamedTemporaryFile("w") as right_file:
-        left_file.write("\n".join(left))
-        left_file.flush()
-
-        right_file.write("\n".join(right))
-        right_file.flush()
-
-        args = [
-                "diff",
-                f"-U{n}",
-                "--label",
-                "current",
-                "--label",
-                "generated",
-        ]
-        if minimal:
-            args.append("--minimal")
-        args.extend([left_file.name, right_file.name])
-
-        output = subprocess.run(
-            args,
-            encoding="utf8",
-            stdout=subprocess.PIPE,
-        ).stdout
-        return output.split("\n")
-
-
 diff_options.add(
     click.option(
         "--ignore-descriptions/--include-descriptions",
@@ -73,6 +46,13 @@ diff_options.add(
         help="only show resource IDs added (+), removed (-), or changed (@)",
     )
 )
+diff_options.add(
+    click.option(
+        "--effective-scopes",
+        is_flag=True,
+        help="show the expanded scopes gained (+) and lost (-) by each role and client",
+    )
+)
 diff_options.add(
     click.option(
         "--minimal",
@@ -82,6 +62,32 @@ diff_options.add(
     )
 )
 
+# this applies only to `tc-admin diff`, and not to other commands sharing its
+# options, such as `apply`
+processes_option = click.option(
+    "--processes",
+    type=int,
+    default=None,
+    help="with --effective-scopes, expand scopes in this many worker processes",
+)
+
+
+def _comparable(c, g):
+    """
+    Return resources c and g, with the same id, ready to be compared.  A secret
+    loaded from a snapshot has only a digest of its value, keyed with the
+    snapshot's salt, so a secret value compared with it is digested in the same
+    way.
+    """
+    if isinstance(c, Secret) and isinstance(g, Secret):
+        c_salt = c._snapshot_salt()
+        g_salt = g._snapshot_salt()
+        if g_salt is not None and c_salt is None:
+            c = c.digested(g_salt)
+        elif c_salt is not None and g_salt is None:
+            g = g.digested(c_salt)
+    return c, g
+
 
 def id_diff(generated, current):
     generated_resources = {r.id: r for r in generated}
@@ -91,9 +97,8 @@ def id_diff(generated, current):
     for id in all_resources:
         if id in generated_resources:
             if id in current_resources:
-                g = generated_resources[id]
-                c = current_resources[id]
-                if c == g:
+                c, g = _comparable(current_resources[id], generated_resources[id])
+                if c.digest == g.digest:
                     continue  # no difference
                 if c.kind == g.kind:
                     c = attr.asdict(c)
@@ -109,46 +114,163 @@ def id_diff(generated, current):
     return "\n".join(rv)
 
 
+def effective_scopes_diff(generated, current, grep=None, processes=None):
+    """
+    Compare the expanded scopes of each Role and Client in Resources instances
+    generated and current, returning a string.  Only roles in each collection
+    take part in expansion, so unmanaged roles are not considered.  With
+    `processes`, the current expansions are divided among that many worker
+    processes.
+    """
+    resolver = Resolver.from_resources(current, cache_size=0)
+    before = expand_all(current, resolver, processes=processes)
+
+    # change the resolver's roles to match generated, noting the scopes whose
+    # expansions may have changed as a result
+    current_roles = {r.roleId: r.scopes for r in current.of_kind(Role)}
+    generated_roles = {r.roleId: r.scopes for r in generated.of_kind(Role)}
+    stale = set()
+    for roleId in sorted(set(current_roles) | set(generated_roles)):
+        if roleId not in current_roles:
+            stale.update(resolver.add_role(roleId, generated_roles[roleId]))
+        elif roleId not in generated_roles:
+            stale.update(resolver.remove_role(roleId))
+        elif current_roles[roleId] != generated_roles[roleId]:
+            stale.update(resolver.update_role(roleId, generated_roles[roleId]))
+
+    # expand only principals that are new, or whose expansions may have changed
+    current_clients = {c.id: c.scopes for c in current.of_kind(Client)}
+    after = {}
+    for role in generated.of_kind(Role):
+        scope = "assume:" + role.roleId
+        if role.id in before and scope not in stale:
+            after[role.id] = before[role.id]
+        else:
+            after[role.id] = resolver.expandScopes([scope])
+    for client in generated.of_kind(Client):
+        if current_clients.get(client.id) == client.scopes and stale.isdisjoint(
+            client.scopes
+        ):
+            after[client.id] = before[client.id]
+        else:
+            after[client.id] = resolver.expandScopes(list(client.scopes))
+
+    reg = re.compile(grep) if grep else None
+    rv = []
+    for id in sorted(set(before) | set(after)):
+        if reg and not reg.search(id):
+            continue
+        gained = sorted(set(after.get(id, [])) - set(before.get(id, [])))
+        lost = sorted(set(before.get(id, [])) - set(after.get(id, [])))
+        if not gained and not lost:
+            continue
+        rv.append(t.yellow("@ {}".format(id)))
+        rv.extend(t.green("  + {}".format(scope)) for scope in gained)
+        rv.extend(t.red("  - {}".format(scope)) for scope in lost)
+    return "\n".join(rv)
+
+
+def _pairs(generated, current):
+    """
+    Pair up the resources in Resources instances generated and current by id,
+    yielding (current, generated) with None for a resource missing from one.
+    Both are sorted by id, so this is a merge-join.
+    """
+    generated = iter(generated)
+    current = iter(current)
+    g = next(generated, None)
+    c = next(current, None)
+    while g is not None or c is not None:
+        if c is None or (g is not None and g.id < c.id):
+            yield None, g
+            g = next(generated, None)
+        elif g is None or c.id < g.id:
+            yield c, None
+            c = next(current, None)
+        else:
+            yield c, g
+            g = next(generated, None)
+            c = next(current, None)
+
+
+def _render(resource):
+    "Render a resource as it appears in str(Resources), as a list of lines"
+    if resource is None:
+        return []
+    return textwrap.indent(str(resource), "  ").split("\n") + [""]
+
+
 def textual_diff(generated, current, context, minimal):
     """
     Compare changes from Resources instances geneated and current, returning a
-    string.
+    string.  Only resources that differ are rendered and compared, each giving
+    its own hunks, labeled with the resource.
     """
-    left = str(current).split("\n")
-    right = str(generated).split("\n")
-    resources_start = left.index("resources:")
-    context_re = re.compile(r"^@@ -([0-9]*),")
-    label_re = re.compile(r"^  ([^ ].*)")  # lines with exactly two spaces indentation
-
-    def contextualize(rangeInfo):
-        "add context information to range (@@ .. @@) line"
-        match = context_re.match(rangeInfo)
-        if not match:
-            return ""
-        line = int(match.group(1))
-        while line > resources_start:
-            line -= 1
-            match = label_re.match(left[line])
-            if match:
-                return match.group(1)
-        return ""
+    hunks = []
+
+    def compare(left, right, label):
+        diff = unified_diff(left, right, context, labels=None, minimal=minimal)
+        hunks.extend((line, label) for line in diff.split("\n")[:-1])
+
+    if list(current.managed) != list(generated.managed):
+        compare(
+            ["managed:"] + ["  - " + m for m in current.managed] + [""],
+            ["managed:"] + ["  - " + m for m in generated.managed] + [""],
+            "",
+        )
+    for c, g in _pairs(generated, current):
+        c, g = _comparable(c, g)
+        if c is not None and g is not None and c.digest == g.digest:
+            continue  # no difference
+        left = _render(c)
+        right = _render(g)
+        compare(left, right, (left or right)[0].strip())
 
-    lines = fast_diff(left, right, context, minimal)
-    colors = defaultdict(lambda: lambda s: s)
+    if not hunks:
+        return ""
+    colors = defaultdict(lambda: lambda s, label: s)
     colors.update({
-        "-": lambda s: t.red(strip_ansi(s)),
-        "+": lambda s: t.green(strip_ansi(s)),
-        "@": lambda s: t.yellow(strip_ansi(s)) + " " + contextualize(s),
+        "-": lambda s, label: t.red(strip_ansi(s)),
+        "+": lambda s, label: t.green(strip_ansi(s)),
+        "@": lambda s, label: t.yellow(strip_ansi(s)) + " " + label,
     })
     # colorize the lines
+    lines = [("--- current", ""), ("+++ generated", "")] + hunks + [("", "")]
     lines = (
-        colors[l[0]](l).rstrip() for l in (line if line else " " for line in lines)
+        colors[l[0]](l, label).rstrip()
+        for l, label in ((line if line else " ", label) for line, label in lines)
     )
     return "\n".join(lines)
 
 
-@with_options("ignore_descriptions", "grep", "ids_only", "context", "minimal")
-def show_diff(generated, current, ignore_descriptions, grep, ids_only, context, minimal):
+@with_options(
+    "ignore_descriptions",
+    "grep",
+    "ids_only",
+    "context",
+    "effective_scopes",
+    "processes",
+    "minimal",
+)
+def show_diff(
+    generated,
+    current,
+    ignore_descriptions,
+    grep,
+    ids_only,
+    context,
+    effective_scopes,
+    processes,
+    minimal,
+):
+    if processes is not None and not effective_scopes:
+        raise click.UsageError("--processes requires --effective-scopes")
+    if effective_scopes:
+        # expansion involves all roles, so --grep only limits the output
+        result = effective_scopes_diff(generated, current, grep, processes)
+        print(result)
+        return result.strip() != ""
+
     # limit the resources considered if --grep
     if grep:
         generated = generated.filter(grep)
@@ -156,14 +278,8 @@ def show_diff(generated, current, ignore_descriptions, grep, ids_only, context,
 
     # reset descriptions to '' if --ignore-descriptions
     if ignore_descriptions:
-        generated = Resources(
-            managed=generated.managed,
-            resources=(r.evolve(description="") for r in generated.resources),
-        )
-        current = Resources(
-            managed=current.managed,
-            resources=(r.evolve(description="") for r in current.resources),
-        )
+        generated = generated.map(lambda r: r.evolve(description=""))
+        current = current.map(lambda r: r.evolve(description=""))
 
     if ids_only:
         result = id_diff(generated, current)
@@ -21,7 +21,10 @@ async def resources():
     """
     appconfig = AppConfig.current()
     resources = Resources()
-    await appconfig.generators._call_all(resources)
+    # merge fragments of the same resource, such as scopes added to a role by
+    # several generators, only once
+    with resources.bulk():
+        await appconfig.generators._call_all(resources)
     for mod in appconfig.modifiers:
         resources = await mod(resources)
     return resources
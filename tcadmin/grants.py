@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import click
+
+from .util.grants import GrantIndex
+from .options import with_options, grants_options
+
+
+grants_options.add(
+    click.option(
+        "--generated/--current",
+        default=False,
+        help="search the generated or current (default) configuration",
+    )
+)
+
+
+def who_grants(resources, scope):
+    """
+    Return a string listing each role and client in the Resources instance that
+    grants the given scope, with the chain of scopes that grants it.
+    """
+    index = GrantIndex.from_resources(resources)
+    rv = []
+    for id, chain in index.who_grants(scope):
+        rv.append(id)
+        rv.append("  " + " -> ".join(chain))
+    return "\n".join(rv)
+
+
+@with_options("generated")
+def show_grants(generated_resources, current_resources, scope, generated):
+    result = who_grants(generated_resources if generated else current_resources, scope)
+    print(result)
+    return result.strip() != ""
@@ -15,9 +15,12 @@ from .appconfig import AppConfig
 from . import current
 from . import generate
 from . import output
+from . import snapshot
 from . import diff
 from . import check
 from . import apply
+from . import grants
+from . import rolecosts
 from . import options
 
 
@@ -64,6 +67,7 @@ def main(appconfig):
     @cmd.command(name="generate")
     @options.generate_options.apply
     @options.output_options.apply
+    @options.snapshot_options.apply
     @appconfig.options._apply
     @run_async
     @with_aiohttp_session
@@ -71,26 +75,36 @@ def main(appconfig):
         "Generate the the expected runtime configuration"
         run_pre_check("generate")
         with AppConfig._as_current(appconfig):
-            output.display_resources(await generate.resources())
+            resources = snapshot.load_snapshot()
+            if resources is None:
+                resources = await generate.resources()
+            snapshot.save_snapshot(resources)
+            output.display_resources(resources)
 
     @cmd.command(name="current")
     @options.generate_options.apply
     @options.output_options.apply
+    @options.snapshot_options.apply
     @appconfig.options._apply
     @run_async
     @with_aiohttp_session
     async def currentCommand(**kwargs):
         "Fetch the current runtime configuration"
-        # generate the expected resources so that we can limit the current
-        # resources to only what we manage
         run_pre_check("current")
         with AppConfig._as_current(appconfig):
-            expected = await generate.resources()
-            output.display_resources(await current.resources(expected.managed))
+            resources = snapshot.load_snapshot()
+            if resources is None:
+                # generate the expected resources so that we can limit the
+                # current resources to only what we manage
+                expected = await generate.resources()
+                resources = await current.resources(expected.managed)
+            snapshot.save_snapshot(resources)
+            output.display_resources(resources)
 
     @cmd.command(name="diff")
     @options.generate_options.apply
     @options.diff_options.apply
+    @diff.processes_option
     @appconfig.options._apply
     @run_async
     @with_aiohttp_session
@@ -133,4 +147,44 @@ def main(appconfig):
             actual = await current.resources(expected.managed)
             await apply.apply_changes(expected, actual)
 
+    @cmd.command(name="who-grants")
+    @click.argument("scope")
+    @options.generate_options.apply
+    @options.grants_options.apply
+    @appconfig.options._apply
+    @run_async
+    @with_aiohttp_session
+    async def whoGrantsCommand(scope, **kwargs):
+        """Show the roles and clients that grant the given scope
+
+        Each is followed by the chain of scopes through which it grants the
+        scope.  The current configuration is searched unless `--generated` is
+        given; in either case only managed roles and clients are considered."""
+        run_pre_check("who-grants")
+        with AppConfig._as_current(appconfig):
+            expected = await generate.resources()
+            actual = await current.resources(expected.managed)
+            if not grants.show_grants(expected, actual, scope):
+                sys.exit(1)
+
+    @cmd.command(name="role-costs")
+    @options.generate_options.apply
+    @options.role_costs_options.apply
+    @appconfig.options._apply
+    @run_async
+    @with_aiohttp_session
+    async def roleCostsCommand(**kwargs):
+        """Show the roles that are most expensive to expand
+
+        For each role, this shows the number of scopes in its expansion, the
+        longest chain of roles it grants, the number of roles it grants
+        directly, and the size of the cycle of roles it is part of, if any.  It
+        warns if applying the generated configuration would increase the total
+        size of all role expansions."""
+        run_pre_check("role-costs")
+        with AppConfig._as_current(appconfig):
+            expected = await generate.resources()
+            actual = await current.resources(expected.managed)
+            rolecosts.show_role_costs(expected, actual)
+
     cmd()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+from .resources import Role, Client
+from .util.scopes import Resolver, ScopeSet
+
+
+def _minimize(resolver, scopes, roleId=None):
+    """
+    Return the given scopes without those already granted by the expansion of
+    the others.  If `roleId` is given, scopes whose expansion includes that
+    role are not relied upon, as they grant the role's own scopes.
+    """
+    # parameterized scopes of star roles depend on the parameter, so they are
+    # neither removed nor relied upon
+    if roleId and roleId.endswith("*"):
+        fixed = [s for s in scopes if "<..>" not in s]
+    else:
+        fixed = list(scopes)
+
+    def reaches_role(closure):
+        return any(
+            r == roleId
+            for scope in closure
+            if scope.startswith("assume:") or scope.endswith("*")
+            for r, _ in resolver._matches(scope)
+        )
+
+    closures = {}
+    for scope in fixed:
+        closure = resolver._closure(scope)
+        if len(closure) > 1 and not (roleId and reaches_role(closure)):
+            closures[scope] = closure
+
+    kept = set(scopes)
+
+    def granted_by_others(scope=None):
+        "Return the scopes granted by the kept expanding scopes other than `scope`"
+        return ScopeSet(
+            [s for p, closure in closures.items() if p in kept and p != scope for s in closure]
+        )
+
+    # only scopes in `closures` grant anything, so the set granted by the others
+    # need only be rebuilt for one of those
+    granted = granted_by_others()
+    for scope in sorted(fixed):
+        if scope in closures:
+            others = granted_by_others(scope)
+            if others.satisfies(scope):
+                kept.discard(scope)
+                granted = others
+        elif granted.satisfies(scope):
+            kept.discard(scope)
+    return sorted(kept)
+
+
+async def minimize_scopes(resources):
+    """
+    Remove from each Role and Client the scopes that it already has through its
+    `assume:` scopes, without changing the expansion of any role or client.
+    Register this as a modifier, after any others that add scopes:
+
+        appconfig.modifiers.register(minimize_scopes)
+    """
+    resolver = Resolver.from_resources(resources, cache_size=0)
+
+    def minimize(resource):
+        if isinstance(resource, Role):
+            return resource.evolve(
+                scopes=_minimize(resolver, resource.scopes, resource.roleId)
+            )
+        if isinstance(resource, Client):
+            return resource.evolve(scopes=_minimize(resolver, resource.scopes))
+        return resource
+
+    return resources.map(minimize)
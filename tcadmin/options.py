@@ -34,9 +34,12 @@ class ClickOptionsRegistry:
 
 generate_options = ClickOptionsRegistry("generate_options")
 output_options = ClickOptionsRegistry("output_options")
+snapshot_options = ClickOptionsRegistry("snapshot_options")
 diff_options = ClickOptionsRegistry("diff_options")
 check_options = ClickOptionsRegistry("check_options")
 apply_options = ClickOptionsRegistry("apply_options")
+grants_options = ClickOptionsRegistry("grants_options")
+role_costs_options = ClickOptionsRegistry("role_costs_options")
 
 
 @contextlib.contextmanager
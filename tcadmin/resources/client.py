@@ -14,7 +14,7 @@ from ..util.scopes import normalizeScopes
 FOREVER = datetime.datetime(3000, 1, 1, 0, 0, 0)
 
 
-@attr.s
+@attr.s(slots=True)
 class Client(Resource):
     clientId = attr.ib(type=str)
     description = attr.ib(type=str, converter=description_converter)
@@ -46,12 +46,20 @@ class Client(Resource):
         }
 
     def merge(self, other):
-        assert self.clientId == other.clientId
-        if self.description != other.description:
-            raise RuntimeError(
-                "Descriptions for {} to be merged differ".format(self.id)
-            )
-        scopes = normalizeScopes(self.scopes + other.scopes)
+        return self.merge_all([other])
+
+    def merge_all(self, others):
+        # accumulate the scopes of all of the fragments and normalize only once
+        scopes = list(self.scopes)
+        for other in others:
+            assert self.clientId == other.clientId
+            if self.description != other.description:
+                raise RuntimeError(
+                    "Descriptions for {} to be merged differ".format(self.id)
+                )
+            scopes.extend(other.scopes)
         return Client(
-            clientId=self.clientId, description=self.description, scopes=scopes
+            clientId=self.clientId,
+            description=self.description,
+            scopes=normalizeScopes(scopes),
         )
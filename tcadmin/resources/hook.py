@@ -41,7 +41,7 @@ class Binding(object):
         return cls(**api_result)
 
 
-@attr.s
+@attr.s(slots=True)
 class Hook(Resource):
     hookGroupId = attr.ib(type=str)
     hookId = attr.ib(type=str)
@@ -61,8 +61,7 @@ class Hook(Resource):
     task = attr.ib(type=dict, metadata={"formatter": json_formatter})
     triggerSchema = attr.ib(type=dict, metadata={"formatter": json_formatter})
 
-    @property
-    def id(self):
+    def _make_id(self):
         return "{}={}/{}".format(self.kind, self.hookGroupId, self.hookId)
 
     @classmethod
@@ -84,6 +83,19 @@ class Hook(Resource):
             triggerSchema=api_result["triggerSchema"],
         )
 
+    def _to_snapshot(self, salt=None):
+        values = super(Hook, self)._to_snapshot(salt)
+        i = list(attr.fields_dict(Hook)).index("bindings")
+        values[i] = [[b.exchange, b.routingKeyPattern] for b in self.bindings]
+        return values
+
+    @classmethod
+    def _from_snapshot(cls, values, salt=None):
+        values = list(values)
+        i = list(attr.fields_dict(Hook)).index("bindings")
+        values[i] = [Binding(*b) for b in values[i]]
+        return super(Hook, cls)._from_snapshot(values, salt)
+
     def to_api(self):
         "Construct a payload for Hooks.createHook and Hooks.updateHook"
         return {
@@ -5,21 +5,38 @@
 # obtain one at http://mozilla.org/MPL/2.0/.
 
 import re
+import json
+import zlib
 import attr
+import hashlib
+import secrets
 import blessings
 import functools
+import itertools
 import textwrap
+from contextlib import contextmanager
 from sortedcontainers import SortedKeyList
 
-from ..util.matchlist import MatchList
+from ..util.matchlist import MatchList, literal_prefix
 from ..util.json import pretty_json
 
 t = blessings.Terminal()
 
+# Snapshots begin with this magic string and a single-byte format version,
+# followed by zlib-compressed compact JSON
+SNAPSHOT_MAGIC = b"tc-admin-snapshot"
+SNAPSHOT_VERSION = 2
+
+
+class _ResourceCache(object):
+    "Slots for values computed from, and cached on, a Resource instance"
+
+    __slots__ = ("_id", "_digest")
+
 
 @functools.total_ordering
 @attr.s(slots=True, frozen=True)
-class Resource(object):
+class Resource(_ResourceCache):
     """
     Base class for a single runtime configuration resource
     """
@@ -79,6 +96,25 @@ class Resource(object):
         d["kind"] = self.kind
         return d
 
+    def _to_snapshot(self, salt=None):
+        """Return a JSON-able list of the values of this object's fields, in order.
+        Any secret values are digested, keyed with the given salt."""
+        return [getattr(self, field.name) for field in attr.fields(self.__class__)]
+
+    def _snapshot_salt(self):
+        "Return the salt with which this object's values were digested, if any"
+        return None
+
+    @classmethod
+    def _from_snapshot(cls, values, salt=None):
+        "Given the result of _to_snapshot with the given salt, create a new object"
+        kwargs = {}
+        for field, value in zip(attr.fields(cls), values):
+            if field.type is tuple:
+                value = tuple(value)
+            kwargs[field.name] = value
+        return cls._construct_without_converters(**kwargs)
+
     def to_api(self):
         "Construct a payload for Taskcluster API methods"
         raise NotImplementedError
@@ -92,6 +128,14 @@ class Resource(object):
         """
         raise RuntimeError("Cannot merge resources of kind {}".format(self.kind))
 
+    def merge_all(self, others):
+        """
+        Construct a resource merging this resource with each of the given
+        resources in turn, as if by repeated calls to `merge`.  Subclasses can
+        override this to merge many resources more efficiently.
+        """
+        return functools.reduce(lambda a, b: a.merge(b), others, self)
+
     @property
     def kind(self):
         "The kind of this instance"
@@ -100,10 +144,41 @@ class Resource(object):
     @property
     def id(self):
         "The id of this instance, including the kind name"
+        try:
+            return self._id
+        except AttributeError:
+            # instances not built with __init__, such as copies, compute it here
+            self.__attrs_post_init__()
+            return self._id
+
+    def _make_id(self):
+        "Construct the id of this instance; it is computed once, at construction"
         return "{}={}".format(
             self.kind, getattr(self, attr.fields(self.__class__)[0].name)
         )
 
+    def __attrs_post_init__(self):
+        object.__setattr__(self, "_id", self._make_id())
+
+    @property
+    def digest(self):
+        """A canonical digest of the content of this resource, including its
+        kind.  This is computed only once, so field values such as dictionaries
+        must not be modified in place."""
+        try:
+            return self._digest
+        except AttributeError:
+            pass
+        content = json.dumps(
+            [self.kind, self._to_snapshot()],
+            sort_keys=True,
+            separators=(",", ":"),
+            default=repr,
+        )
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        object.__setattr__(self, "_digest", digest)
+        return digest
+
     def evolve(self, **args):
         "Create a new resource like this one, but with the named attributes replaced"
         return attr.evolve(self, **args)
@@ -123,16 +198,30 @@ class Resource(object):
         return "\n".join(rv)
 
 
-@attr.s(repr=False)
+def _with_id_prefix(resources, prefix):
+    """Iterate, in order, over the resources in the given SortedKeyList with ids
+    beginning with the given prefix.  Since the resources are sorted by id,
+    these are contiguous and can be found by bisection."""
+    for resource in resources.irange_key(min_key=prefix):
+        if not resource.id.startswith(prefix):
+            break
+        yield resource
+
+
+@attr.s(repr=False, eq=False)
 class Resources:
     """
     Container class for multiple resource instances.
 
     This class also tracks what resources are "managed", allowing deletion of
     resources that are no longer defined.
+
+    The collections returned from `filter` and `map` are lazy "views": they
+    share the sorted list of the collection they were derived from, and apply
+    their operations in a single pass when first used.
     """
 
-    resources = attr.ib(
+    _resources = attr.ib(
         type=SortedKeyList,
         converter=lambda resources: SortedKeyList(resources, key=lambda r: r.id),
         default=[],
@@ -144,37 +233,129 @@ class Resources:
     )
 
     def __attrs_post_init__(self):
-        self._by_id = {r.id: r for r in self.resources}
-        if len(self._by_id) != len(self.resources):
+        self._by_id = {r.id: r for r in self._resources}
+        if len(self._by_id) != len(self._resources):
             raise RuntimeError("duplicate resources passed to Resources constructor")
+        # resources added within `bulk()`, grouped by id in the order added, and
+        # the ids of those resources, in the order added
+        self._pending = {}
+        self._pending_ids = []
+        self._bulk_depth = 0
+        # for an unmaterialized view, the sorted list it is derived from, an id
+        # prefix to narrow that list, and the operations to apply to it
+        self._base = None
+        self._id_prefix = None
+        self._operations = None
+        self._mapped = False
+        # true if a view refers to self._resources, which must then be copied
+        # before it is modified
+        self._shared = False
+        # results of `fingerprint`, by kind, cleared on modification
+        self._fingerprints = None
+        # the MatchList against which every resource was last verified
+        self._verified_managed = None
         self._verify()
 
-    def add(self, resource, _skip_verify=False):
+    @property
+    def resources(self):
+        "The resources in this collection, as a SortedKeyList"
+        self._materialize()
+        return self._resources
+
+    def _mutable_resources(self):
+        "Return self._resources, ready to be modified"
+        self._materialize()
+        if self._shared:
+            self._resources = self._resources.copy()
+            self._shared = False
+        self._fingerprints = None
+        return self._resources
+
+    def add(self, resource):
         "Add the given resource to the collection"
         if not self.is_managed(resource.id):
             raise RuntimeError("unmanaged resource: " + resource.id)
 
+        if self._bulk_depth:
+            self._pending.setdefault(resource.id, []).append(resource)
+            self._pending_ids.append(resource.id)
+            return
+
+        resources = self._mutable_resources()
+
         # if the resource already exists, try to merge it and remove the
         # previous version from the list of resources (SortedKeyList does not
         # support in-place replacement of items)
         if resource.id in self._by_id:
             existing = self._by_id[resource.id]
             resource = self._by_id[resource.id].merge(resource)
-            idx = self.resources.index(existing)
-            del self.resources[idx]
+            idx = resources.index(existing)
+            del resources[idx]
 
         self._by_id[resource.id] = resource
-        self.resources.add(resource)
+        resources.add(resource)
 
-        if not _skip_verify:
-            self._verify()
+        self._verify()
 
     def update(self, resources):
         "Add the given resources to the collection"
-        for resource in resources:
-            if not self.is_managed(resource.id):
-                raise RuntimeError("unmanaged resource: " + resource.id)
-            self.add(resource, _skip_verify=True)
+        with self.bulk():
+            for resource in resources:
+                self.add(resource)
+
+    @contextmanager
+    def bulk(self):
+        """
+        Context manager to add many resources at once.  Within the block,
+        `add` only checks that each resource is managed and sets it aside.
+        When the outermost block exits, or the collection is next read, the
+        resources for each id are merged with `merge_all` in the order they
+        were added and the sorted collection is updated once.  If a block,
+        nested or not, raises an exception, resources set aside within it are
+        discarded, unless the collection was read within it.
+        """
+        self._bulk_depth += 1
+        pending_ids = self._pending_ids
+        mark = len(pending_ids)
+        try:
+            yield self
+        except BaseException:
+            self._bulk_depth -= 1
+            # reading the collection replaces the list of pending ids, after
+            # which everything pending was added within this block
+            if self._pending_ids is not pending_ids:
+                mark = 0
+            for id in self._pending_ids[mark:]:
+                group = self._pending[id]
+                group.pop()
+                if not group:
+                    del self._pending[id]
+            del self._pending_ids[mark:]
+            raise
+        self._bulk_depth -= 1
+        if not self._bulk_depth:
+            self._materialize()
+
+    def _add_pending(self):
+        "Merge the resources set aside by `bulk` into the collection"
+        pending, self._pending = self._pending, {}
+        self._pending_ids = []
+        resources = self._mutable_resources()
+
+        # merge everything before modifying the collection, so that a failed
+        # merge leaves it untouched
+        merged = {}
+        for id, group in pending.items():
+            if id in self._by_id:
+                group.insert(0, self._by_id[id])
+            merged[id] = group[0].merge_all(group[1:])
+
+        for id, resource in merged.items():
+            if id in self._by_id:
+                resources.remove(self._by_id[id])
+            self._by_id[id] = resource
+        resources.update(merged.values())
+
         self._verify()
 
     def manage(self, pattern):
@@ -185,24 +366,119 @@ class Resources:
         """Return a new Resources object with only resources matching the given regexp. The
         'manages' property does not change."""
         reg = re.compile(pattern)
-        return Resources(
-            resources=[r for r in self.resources if reg.search(r.id)],
-            managed=self.managed,
-        )
+
+        def select(resources):
+            return (r for r in resources if reg.search(r.id))
+
+        # a pattern anchored with `^` can only match ids beginning with its
+        # literal prefix, so only those need be searched
+        id_prefix = literal_prefix(pattern[1:]) if pattern.startswith("^") else None
+        return self._view(select, id_prefix=id_prefix)
 
     def map(self, functor):
         """Call functor for each resource in this collection, returning a new Resources
         containing the result."""
-        return Resources(
-            resources=[functor(r) for r in self.resources], managed=self.managed
-        )
+
+        def apply(resources):
+            return (functor(r) for r in resources)
+
+        return self._view(apply, mapped=True)
+
+    def _view(self, operation, id_prefix=None, mapped=False):
+        """Return a view applying `operation`, a function from an iterable of
+        resources to another, to the resources in this collection.  Views of
+        unmaterialized views combine their operations."""
+        # resources set aside by `bulk` must be in the list the view shares
+        if self._pending:
+            self._materialize()
+        view = Resources(managed=self.managed)
+        if self._base is not None:
+            view._base = self._base
+            view._id_prefix = self._id_prefix
+            view._operations = self._operations + [operation]
+            view._mapped = self._mapped or mapped
+        else:
+            self._shared = True
+            view._base = self._resources
+            view._id_prefix = id_prefix
+            view._operations = [operation]
+            view._mapped = mapped
+        return view
+
+    def _materialize(self):
+        """Bring self._resources up to date, applying the operations of a view
+        and adding any resources set aside by `bulk`"""
+        if self._base is not None:
+            self._apply_operations()
+        if self._pending:
+            self._add_pending()
+
+    def _apply_operations(self):
+        "Apply the operations of a view to build its own sorted list"
+        resources = self._base
+        if self._id_prefix:
+            resources = _with_id_prefix(resources, self._id_prefix)
+        for operation in self._operations:
+            resources = operation(resources)
+        resources = SortedKeyList(resources, key=lambda r: r.id)
+        by_id = {r.id: r for r in resources}
+        if len(by_id) != len(resources):
+            raise RuntimeError("duplicate resources passed to Resources constructor")
+
+        self._resources, self._by_id = resources, by_id
+        self._base = self._id_prefix = self._operations = None
+        # resources drawn from a verified collection need not be checked again,
+        # but those returned from a `map` functor do
+        if self._mapped:
+            self._verified_managed = None
+            self._mapped = False
+            self._verify()
+
+    def of_kind(self, kind):
+        """Return a sorted list of the resources of the given kind, given as a
+        Resource subclass (such as `Role`) or its name."""
+        if not isinstance(kind, str):
+            kind = kind.__name__
+        return list(_with_id_prefix(self.resources, kind + "="))
+
+    def fingerprint(self, kind=None):
+        """Return a digest of the content of all resources in this collection,
+        or of those of the given kind, given as a Resource subclass or its name.
+        This is a hash over the kind fingerprints, each of which is a hash over
+        the ids and digests of the resources of that kind, so two collections
+        with equal fingerprints contain the same resources."""
+        if kind is not None and not isinstance(kind, str):
+            kind = kind.__name__
+        if self._fingerprints is None:
+            fingerprints = {}
+            # resources of each kind are contiguous, as ids begin with the kind
+            for k, group in itertools.groupby(self.resources, key=lambda r: r.kind):
+                m = hashlib.sha256()
+                for r in group:
+                    m.update("{}\n{}\n".format(r.id, r.digest).encode("utf-8"))
+                fingerprints[k] = m.hexdigest()
+            m = hashlib.sha256()
+            for k, f in fingerprints.items():
+                m.update("{}\n{}\n".format(k, f).encode("utf-8"))
+            fingerprints[None] = m.hexdigest()
+            self._fingerprints = fingerprints
+        try:
+            return self._fingerprints[kind]
+        except KeyError:
+            return hashlib.sha256().hexdigest()
 
     def _verify(self):
         "Verify that this set of resources is legal (all managed, no duplicates)"
 
+        # `add` checks each resource as it arrives, and a MatchList only ever
+        # grows, so the full walk is only required when `managed` is replaced.
+        if self._verified_managed is self.managed:
+            return
+
         unmanaged = sorted([r.id for r in self if not self.is_managed(r.id)])
         if unmanaged:
             raise RuntimeError("unmanaged resources: " + ", ".join(unmanaged))
+        self._verified_managed = self.managed
 
     def is_managed(self, id):
         "Return True if the given id is managed"
@@ -211,6 +487,11 @@ class Resources:
     def __iter__(self):
         return self.resources.__iter__()
 
+    def __eq__(self, other):
+        if not isinstance(other, Resources):
+            return NotImplemented
+        return self.resources == other.resources and self.managed == other.managed
+
     def __str__(self):
         self._verify()
         return "managed:\n{}\n\nresources:\n{}".format(
@@ -231,3 +512,41 @@ class Resources:
         return Resources(
             (Resource.from_json(r) for r in json["resources"]), json["managed"]
         )
+
+    def to_snapshot(self):
+        """Convert to a compact, versioned binary snapshot.  Secret values are
+        represented only by their digests, keyed with a random salt recorded in
+        the snapshot.  A collection loaded from a snapshot keeps its salt."""
+        self._verify()
+        salts = set(r._snapshot_salt() for r in self) - {None}
+        if len(salts) > 1:
+            raise ValueError("cannot snapshot secrets digested with different salts")
+        salt = salts.pop() if salts else secrets.token_hex(16)
+        data = {
+            "managed": list(self.managed),
+            "salt": salt,
+            "resources": [[r.kind, r._to_snapshot(salt)] for r in self],
+        }
+        return (
+            SNAPSHOT_MAGIC
+            + bytes([SNAPSHOT_VERSION])
+            + zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+        )
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        "Create a new object from the result of to_snapshot"
+        if not snapshot.startswith(SNAPSHOT_MAGIC):
+            raise ValueError("not a tc-admin snapshot")
+        version = snapshot[len(SNAPSHOT_MAGIC)]
+        if version != SNAPSHOT_VERSION:
+            raise ValueError("unsupported snapshot version {}".format(version))
+        data = json.loads(zlib.decompress(snapshot[len(SNAPSHOT_MAGIC) + 1:]))
+        kind_classes = Resource._kind_classes()
+        return Resources(
+            (
+                kind_classes[k]._from_snapshot(values, data["salt"])
+                for k, values in data["resources"]
+            ),
+            data["managed"],
+        )
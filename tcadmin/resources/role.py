@@ -11,7 +11,7 @@ from .util import description_converter, scopes_converter, list_formatter
 from ..util.scopes import normalizeScopes
 
 
-@attr.s
+@attr.s(slots=True)
 class Role(Resource):
     roleId = attr.ib(type=str)
     description = attr.ib(type=str, converter=description_converter)
@@ -33,10 +33,20 @@ class Role(Resource):
         return {"description": self.description, "scopes": self.scopes}
 
     def merge(self, other):
-        assert self.roleId == other.roleId
-        if self.description != other.description:
-            raise RuntimeError(
-                "Descriptions for {} to be merged differ".format(self.id)
-            )
-        scopes = normalizeScopes(self.scopes + other.scopes)
-        return Role(roleId=self.roleId, description=self.description, scopes=scopes)
+        return self.merge_all([other])
+
+    def merge_all(self, others):
+        # accumulate the scopes of all of the fragments and normalize only once
+        scopes = list(self.scopes)
+        for other in others:
+            assert self.roleId == other.roleId
+            if self.description != other.description:
+                raise RuntimeError(
+                    "Descriptions for {} to be merged differ".format(self.id)
+                )
+            scopes.extend(other.scopes)
+        return Role(
+            roleId=self.roleId,
+            description=self.description,
+            scopes=normalizeScopes(scopes),
+        )
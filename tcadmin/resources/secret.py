@@ -8,6 +8,7 @@ import attr
 import datetime
 import random
 import hashlib
+import hmac
 import json
 
 from .resources import Resource
@@ -27,19 +28,46 @@ class NoSecret:
 PER_RUN_SALT = str(random.randrange(2 ** 64)).encode("ascii")
 
 
+@attr.s(frozen=True)
+class SecretDigest:
+    """
+    A stand-in for a secret value, recording only a digest of that value, keyed
+    with a salt.  This is used in snapshots, which do not contain secret values
+    and each have their own random salt, so that a digest cannot be used to
+    confirm a guessed value without that salt.  Secrets with a SecretDigest
+    value can be compared (with values digested under the same salt) and
+    displayed, but not applied.
+    """
+
+    digest = attr.ib(type=str)
+    salt = attr.ib(type=str)
+
+    @classmethod
+    def of(cls, value, salt=None):
+        "Return the SecretDigest for the given secret value, keyed with the given salt"
+        if salt is None:
+            salt = PER_RUN_SALT.decode("ascii")
+        m = hmac.new(salt.encode("ascii"), digestmod=hashlib.sha256)
+        m.update(json.dumps(value, sort_keys=True).encode("utf-8"))
+        return cls(m.hexdigest(), salt)
+
+
 def secret_formatter(id, value):
     """Format a secret value in a format that does not reveal the actual value, but
     still reliably identifies changes in the secret."""
     if value is NoSecret:
         return "<unknown>"
+    if not isinstance(value, SecretDigest):
+        value = SecretDigest.of(value)
     m = hashlib.sha256()
     m.update(PER_RUN_SALT)
     m.update(id.encode("ascii"))
-    m.update(json.dumps(value, sort_keys=True).encode("utf-8"))
+    m.update(value.salt.encode("ascii"))
+    m.update(value.digest.encode("ascii"))
     return m.hexdigest()[:10]
 
 
-@attr.s
+@attr.s(slots=True)
 class Secret(Resource):
     name = attr.ib(type=str)
     secret = attr.ib(
@@ -59,6 +87,39 @@ class Secret(Resource):
         # the moment this is not implemented
         raise NotImplementedError("from_json is not implemented for Secrets")
 
+    def _to_snapshot(self, salt=None):
+        if self.secret is NoSecret:
+            digest = None
+        elif isinstance(self.secret, SecretDigest):
+            if salt is not None and self.secret.salt != salt:
+                raise ValueError(
+                    "secret {} was digested with a different salt".format(self.name)
+                )
+            digest = self.secret.digest
+        else:
+            digest = SecretDigest.of(self.secret, salt).digest
+        return [self.name, digest]
+
+    def _snapshot_salt(self):
+        if isinstance(self.secret, SecretDigest):
+            return self.secret.salt
+        return None
+
+    @classmethod
+    def _from_snapshot(cls, values, salt=None):
+        name, digest = values
+        return cls._construct_without_converters(
+            name=name,
+            secret=NoSecret if digest is None else SecretDigest(digest, salt),
+        )
+
+    def digested(self, salt):
+        """Return this secret with its value replaced by a SecretDigest keyed with
+        the given salt, allowing comparison with a secret loaded from a snapshot"""
+        if not self.has_secret():
+            return self
+        return self.evolve(secret=SecretDigest.of(self.secret, salt))
+
     @classmethod
     def from_api(cls, name, api_result=None):
         "Construct a new instance from the result of a taskcluster API call"
@@ -76,5 +137,5 @@ class Secret(Resource):
         return {"expires": FOREVER, "secret": self.secret}
 
     def has_secret(self):
-        "Return true if this secret has a value (is not NoSecret)"
-        return self.secret is not NoSecret
+        "Return true if this secret has a value (is not NoSecret or a SecretDigest)"
+        return self.secret is not NoSecret and not isinstance(self.secret, SecretDigest)
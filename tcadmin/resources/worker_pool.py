@@ -10,7 +10,7 @@ from .resources import Resource
 from .util import description_converter, json_formatter
 
 
-@attr.s
+@attr.s(slots=True)
 class WorkerPool(Resource):
     workerPoolId = attr.ib(type=str)
     description = attr.ib(type=str, converter=description_converter)
@@ -19,8 +19,7 @@ class WorkerPool(Resource):
     emailOnError = attr.ib(type=bool)
     providerId = attr.ib(type=str)
 
-    @property
-    def id(self):
+    def _make_id(self):
         return "{}={}".format(self.kind, self.workerPoolId)
 
     @classmethod
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import click
+import blessings
+
+from .util.rolecosts import analyze_roles, total_closure
+from .resources import Role
+from .options import with_options, role_costs_options
+
+t = blessings.Terminal()
+
+ROW = "{:>8} {:>6} {:>8} {:>6}  {}"
+
+role_costs_options.add(
+    click.option(
+        "--generated/--current",
+        default=True,
+        help="analyze the generated (default) or current roles",
+    )
+)
+role_costs_options.add(
+    click.option(
+        "--top", type=int, default=20, help="number of roles to show (default 20)"
+    )
+)
+
+
+def _costs(resources):
+    return analyze_roles({r.roleId: list(r.scopes) for r in resources.of_kind(Role)})
+
+
+def role_costs(generated, current, top=20, use_generated=True):
+    """
+    Analyze the roles in Resources instances generated and current, returning a
+    string showing the most expensive roles in one of them, and comparing the
+    total closure size of both.
+    """
+    generated_costs = _costs(generated)
+    current_costs = _costs(current)
+    costs = generated_costs if use_generated else current_costs
+
+    ranked = sorted(
+        costs.values(), key=lambda c: (-c.closure, -c.depth, -c.fan_out, c.roleId)
+    )
+    rv = [ROW.format("closure", "depth", "fan-out", "cycle", "role")]
+    for cost in ranked[:top]:
+        rv.append(
+            ROW.format(
+                cost.closure,
+                cost.depth,
+                cost.fan_out,
+                cost.component if cost.component > 1 else "",
+                cost.roleId,
+            )
+        )
+
+    before = total_closure(current_costs)
+    after = total_closure(generated_costs)
+    rv.append("")
+    rv.append("total closure size: {} current, {} generated".format(before, after))
+    if after > before:
+        rv.append(
+            t.yellow(
+                "warning: applying this configuration increases the total "
+                "closure size by {}".format(after - before)
+            )
+        )
+    return "\n".join(rv)
+
+
+@with_options("generated", "top")
+def show_role_costs(generated_resources, current_resources, generated, top):
+    print(role_costs(generated_resources, current_resources, top, generated))
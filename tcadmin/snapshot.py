@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import click
+
+from .resources import Resources
+from .options import with_options, snapshot_options
+
+
+snapshot_options.add(
+    click.option(
+        "--snapshot-in",
+        type=click.Path(exists=True, dir_okay=False),
+        help="load resources from this snapshot file instead of building them",
+    )
+)
+snapshot_options.add(
+    click.option(
+        "--snapshot-out",
+        type=click.Path(dir_okay=False, writable=True),
+        help="write resources to this snapshot file",
+    )
+)
+
+
+@with_options("snapshot_in")
+def load_snapshot(snapshot_in):
+    "Load resources from --snapshot-in, returning None if it was not given"
+    if not snapshot_in:
+        return None
+    with open(snapshot_in, "rb") as f:
+        return Resources.from_snapshot(f.read())
+
+
+@with_options("snapshot_out")
+def save_snapshot(resources, snapshot_out):
+    "Write resources to --snapshot-out, if it was given"
+    if not snapshot_out:
+        return
+    with open(snapshot_out, "wb") as f:
+        f.write(resources.to_snapshot())
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from tcadmin import current
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    "Replace the fetchers with fakes that record the kinds fetched"
+    fetched = []
+
+    def fake_fetcher(prefix):
+        async def fetch(resources):
+            fetched.append(prefix)
+
+        return fetch
+
+    monkeypatch.setattr(
+        current,
+        "FETCHERS",
+        [(prefix, fake_fetcher(prefix)) for prefix, _ in current.FETCHERS],
+    )
+    return fetched
+
+
+@pytest.mark.asyncio
+async def test_resources_all_kinds(fetched):
+    await current.resources([".*"])
+    assert sorted(fetched) == [
+        "Client=",
+        "Hook=",
+        "Role=",
+        "Secret=",
+        "WorkerPool=",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_resources_pruned_kinds(fetched):
+    await current.resources(["Role=repo:.*", "Hook=garbage/.*", "Client=a$"])
+    assert sorted(fetched) == ["Client=", "Hook=", "Role="]
+
+
+@pytest.mark.asyncio
+async def test_resources_nothing_managed(fetched):
+    resources = await current.resources([])
+    assert fetched == []
+    assert list(resources) == []
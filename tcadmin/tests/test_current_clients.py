@@ -18,17 +18,23 @@ def AuthForClients(mocker):
     """
     Mock out Auth in tcadmin.current.clients.
 
-    The expected return value for listClients should be set in Auth.clients
+    The expected return value for listClients should be set in Auth.clients.
+    The prefixes for which clients were listed are in Auth.prefixes.
     """
     Auth = mocker.patch("tcadmin.current.clients.Auth")
     Auth.clients = []
+    Auth.prefixes = []
 
     class FakeAuth:
         async def listClients(self, query={}):
             limit = query.get("limit", 1)
             offset = int(query.get("continuationToken", "0"))
-            res = {"clients": Auth.clients[offset:offset + limit]}
-            if offset + limit < len(Auth.clients):
+            prefix = query.get("prefix", "")
+            if not offset:
+                Auth.prefixes.append(prefix)
+            clients = [c for c in Auth.clients if c["clientId"].startswith(prefix)]
+            res = {"clients": clients[offset:offset + limit]}
+            if offset + limit < len(clients):
                 res["continuationToken"] = str(offset + limit)
             return res
 
@@ -74,3 +80,46 @@ async def test_fetch_clients_unmanaged(AuthForClients, make_client):
     AuthForClients.clients.extend([api_client1, api_client2])
     await fetch_clients(resources)
     assert list(resources) == [Client.from_api(api_client1)]
+
+
+@pytest.mark.asyncio
+async def test_fetch_clients_prefixes(AuthForClients, make_client):
+    "Only clients with managed prefixes are listed"
+    resources = Resources(
+        [],
+        [
+            "^Client=project/releng/.*",
+            "Client=project/releng/scriptworker$",
+            "Client=static/taskcluster/.*",
+            "Role=.*",
+        ],
+    )
+    api_clients = [
+        make_client(clientId="project/releng/a"),
+        make_client(clientId="project/releng/b"),
+        make_client(clientId="project/other/c"),
+        make_client(clientId="static/taskcluster/queue"),
+        make_client(clientId="static/other"),
+    ]
+    AuthForClients.clients.extend(api_clients)
+    await fetch_clients(resources)
+    assert sorted(AuthForClients.prefixes) == [
+        "project/releng/",
+        "static/taskcluster/",
+    ]
+    assert list(resources) == [
+        Client.from_api(api_clients[0]),
+        Client.from_api(api_clients[1]),
+        Client.from_api(api_clients[3]),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_fetch_clients_no_prefix(AuthForClients, make_client):
+    "A managed pattern without a literal prefix requires listing all clients"
+    resources = Resources([], ["Client=project/.*", "Client=[a-z]+$"])
+    api_client = make_client(clientId="abc")
+    AuthForClients.clients.append(api_client)
+    await fetch_clients(resources)
+    assert AuthForClients.prefixes == [""]
+    assert list(resources) == [Client.from_api(api_client)]
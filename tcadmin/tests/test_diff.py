@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import click
+import pytest
+import time
+
+from tcadmin.resources import Resources, Role, Client, Secret
+from tcadmin.diff import effective_scopes_diff, id_diff, textual_diff, show_diff
+from tcadmin.options import test_options as with_test_options
+from tcadmin.util.ansi import strip_ansi
+from tcadmin.util.unidiff import unified_diff
+
+
+pytestmark = pytest.mark.usefixtures("appconfig")
+
+
+@pytest.fixture
+def current():
+    return Resources(
+        [
+            Role(roleId="base", description="", scopes=["base-scope"]),
+            Role(roleId="level-3", description="", scopes=["assume:base", "l3"]),
+            Role(roleId="other", description="", scopes=["other-scope"]),
+            Client(clientId="ci", description="", scopes=["assume:level-3"]),
+            Client(clientId="gone", description="", scopes=["gone-scope"]),
+        ],
+        managed=[".*"],
+    )
+
+
+def test_effective_scopes_diff_unchanged(current):
+    assert effective_scopes_diff(current, current) == ""
+
+
+def test_effective_scopes_diff_transitive(current):
+    generated = Resources(
+        [
+            Role(roleId="base", description="", scopes=["new-base-scope"]),
+            Role(roleId="level-3", description="", scopes=["assume:base", "l3"]),
+            Role(roleId="other", description="", scopes=["other-scope"]),
+            Role(roleId="new", description="", scopes=["n"]),
+            Client(clientId="ci", description="", scopes=["assume:level-3"]),
+        ],
+        managed=[".*"],
+    )
+    assert effective_scopes_diff(generated, current).split("\n") == [
+        "@ Client=ci",
+        "  + new-base-scope",
+        "  - base-scope",
+        "@ Client=gone",
+        "  - gone-scope",
+        "@ Role=base",
+        "  + new-base-scope",
+        "  - base-scope",
+        "@ Role=level-3",
+        "  + new-base-scope",
+        "  - base-scope",
+        "@ Role=new",
+        "  + assume:new",
+        "  + n",
+    ]
+
+
+def test_effective_scopes_diff_processes(current):
+    generated = current.map(
+        lambda r: r.evolve(scopes=["changed"]) if r.id == "Role=base" else r
+    )
+    assert effective_scopes_diff(generated, current, processes=2) == (
+        effective_scopes_diff(generated, current)
+    )
+
+
+def test_show_diff_processes_requires_effective_scopes(current):
+    with with_test_options(
+        ignore_descriptions=False,
+        grep=None,
+        ids_only=False,
+        context=8,
+        effective_scopes=False,
+        processes=2,
+        minimal=False,
+    ):
+        with pytest.raises(click.UsageError) as exc:
+            show_diff(current, current)
+    assert "--processes requires --effective-scopes" in str(exc.value)
+
+
+def test_effective_scopes_diff_grep(current):
+    generated = current.map(
+        lambda r: r.evolve(scopes=["changed"]) if r.id == "Role=base" else r
+    )
+    assert effective_scopes_diff(generated, current, grep="Client=").split("\n") == [
+        "@ Client=ci",
+        "  + changed",
+        "  - base-scope",
+    ]
+
+
+def test_textual_diff():
+    def roles(changed):
+        return Resources(
+            [
+                Role(roleId=id, description="", scopes=["s1", changed.get(id, "s2")])
+                for id in "abcdefgh"
+            ],
+            managed=[".*"],
+        )
+
+    diff = strip_ansi(textual_diff(roles({"e": "s3"}), roles({}), 2, False))
+    assert diff.split("\n") == [
+        "--- current",
+        "+++ generated",
+        "@@ -7,3 +7,3 @@ Role=e:",
+        "     scopes:",
+        "       - s1",
+        "-      - s2",
+        "+      - s3",
+        "",
+    ]
+
+
+def test_textual_diff_added_removed_managed():
+    current = Resources(
+        [
+            Role(roleId="a", description="", scopes=[]),
+            Role(roleId="b", description="", scopes=[]),
+        ],
+        managed=["Role=a", "Role=b"],
+    )
+    generated = Resources(
+        [
+            Role(roleId="b", description="", scopes=[]),
+            Role(roleId="c", description="", scopes=[]),
+        ],
+        managed=["Role=a", "Role=b", "Role=c"],
+    )
+    lines = strip_ansi(textual_diff(generated, current, 8, False)).split("\n")
+    assert [l for l in lines if l.startswith("@@")] == [
+        "@@ -1,3 +1,4 @@",
+        "@@ -1,7 +0,0 @@ Role=a:",
+        "@@ -0,0 +1,7 @@ Role=c:",
+    ]
+    assert "+  - Role=c" in lines
+    assert "-  Role=a:" in lines
+    assert "+  Role=c:" in lines
+    assert "   Role=b:" not in lines
+
+
+def test_textual_diff_unchanged():
+    resources = Resources([Role(roleId="a", description="", scopes=[])], managed=[".*"])
+    assert textual_diff(resources, resources, 8, False) == ""
+
+
+def test_diff_snapshot_secrets():
+    "Secret values are compared with secrets loaded from a snapshot under its salt"
+    current = Resources(
+        [
+            Secret(name="same", secret={"v": 1}),
+            Secret(name="changed", secret={"v": 1}),
+        ],
+        managed=[".*"],
+    )
+    generated = Resources.from_snapshot(
+        Resources(
+            [
+                Secret(name="same", secret={"v": 1}),
+                Secret(name="changed", secret={"v": 2}),
+            ],
+            managed=[".*"],
+        ).to_snapshot()
+    )
+    assert strip_ansi(id_diff(generated, current)) == (
+        "! Secret=changed (changed: secret)"
+    )
+    lines = strip_ansi(textual_diff(generated, current, 8, False)).split("\n")
+    assert [l for l in lines if l.startswith("@@")] == ["@@ -1,3 +1,3 @@ Secret=changed:"]
+
+
+@pytest.mark.slow
+def test_textual_diff_benchmark():
+    def roles(changed):
+        return Resources(
+            [
+                Role(
+                    roleId="role-{}".format(i),
+                    description="",
+                    scopes=["s1", "changed" if i in changed else "s2"],
+                )
+                for i in range(20000)
+            ],
+            managed=[".*"],
+        )
+
+    current = roles(set())
+    generated = roles({5, 5000, 15000})
+    # compute digests ahead of time, as they are cached
+    for r in list(current) + list(generated):
+        r.digest
+
+    start = time.perf_counter()
+    whole = unified_diff(str(current).split("\n"), str(generated).split("\n"), 8)
+    whole_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    diff = textual_diff(generated, current, 8, False)
+    per_resource_time = time.perf_counter() - start
+
+    assert whole.count("@@ -") == diff.count("@@ -") == 3
+    print(
+        "diff of 20000 resources: whole document {:.3f}s, per resource {:.3f}s".format(
+            whole_time, per_resource_time
+        )
+    )
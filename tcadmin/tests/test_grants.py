@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from tcadmin.grants import who_grants
+from tcadmin.resources import Resources, Role, Client
+
+
+pytestmark = pytest.mark.usefixtures("appconfig")
+
+
+def test_who_grants():
+    resources = Resources(
+        [
+            Role(roleId="base", description="", scopes=["queue:create-task:*"]),
+            Client(clientId="ci", description="", scopes=["assume:base"]),
+            Client(clientId="other", description="", scopes=["queue:route:*"]),
+        ],
+        managed=[".*"],
+    )
+    assert who_grants(resources, "queue:create-task:foo").split("\n") == [
+        "Client=ci",
+        "  assume:base -> queue:create-task:*",
+        "Role=base",
+        "  queue:create-task:*",
+    ]
+
+
+def test_who_grants_nobody():
+    resources = Resources([], managed=[".*"])
+    assert who_grants(resources, "queue:create-task:foo") == ""
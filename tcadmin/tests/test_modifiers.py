@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+import random
+
+from tcadmin import modifiers
+from tcadmin.modifiers import minimize_scopes
+from tcadmin.resources import Resources, Role, Client, Secret
+from tcadmin.util.scopes import Resolver
+
+
+pytestmark = pytest.mark.usefixtures("appconfig")
+
+
+async def minimized(resources):
+    result = await minimize_scopes(resources)
+    return {r.id: list(r.scopes) for r in result if r.kind in ("Role", "Client")}
+
+
+@pytest.mark.asyncio
+async def test_minimize_scopes():
+    resources = Resources(
+        [
+            Role(roleId="base", description="", scopes=["a", "b:*"]),
+            Role(roleId="l1", description="", scopes=["assume:base", "a", "b:c"]),
+            Role(roleId="l2", description="", scopes=["assume:l1", "assume:base", "c"]),
+            Client(clientId="ci", description="", scopes=["assume:l2", "b:d", "e"]),
+            Secret(name="s"),
+        ],
+        managed=[".*"],
+    )
+    assert await minimized(resources) == {
+        "Role=base": ["a", "b:*"],
+        "Role=l1": ["assume:base"],
+        "Role=l2": ["assume:l1", "c"],
+        "Client=ci": ["assume:l2", "e"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_minimize_scopes_cycle():
+    "scopes granted only through a cycle back to the role itself are kept"
+    resources = Resources(
+        [
+            Role(roleId="a", description="", scopes=["assume:b", "x"]),
+            Role(roleId="b", description="", scopes=["assume:a", "y"]),
+        ],
+        managed=[".*"],
+    )
+    assert await minimized(resources) == {
+        "Role=a": ["assume:b", "x"],
+        "Role=b": ["assume:a", "y"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_minimize_scopes_parameterized():
+    resources = Resources(
+        [
+            Role(roleId="repo:*", description="", scopes=["assume:proj:<..>", "r"]),
+            Role(roleId="proj:*", description="", scopes=["secrets:<..>", "r"]),
+            Client(
+                clientId="c", description="", scopes=["assume:repo:x", "secrets:x", "r"]
+            ),
+        ],
+        managed=[".*"],
+    )
+    assert await minimized(resources) == {
+        "Role=repo:*": ["assume:proj:<..>", "r"],
+        "Role=proj:*": ["r", "secrets:<..>"],
+        "Client=c": ["assume:repo:x"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_minimize_scopes_large_role(monkeypatch):
+    "The granted scopes are rebuilt only for scopes that expand"
+    built = []
+
+    class CountingScopeSet(modifiers.ScopeSet):
+        def __init__(self, scopes):
+            built.append(len(scopes))
+            super().__init__(scopes)
+
+    monkeypatch.setattr(modifiers, "ScopeSet", CountingScopeSet)
+    scopes = ["scope:{}".format(i) for i in range(3000)] + ["assume:small"]
+    resources = Resources(
+        [
+            Role(roleId="small", description="", scopes=["scope:1*"]),
+            Role(roleId="large", description="", scopes=scopes),
+        ],
+        managed=[".*"],
+    )
+    result = await minimized(resources)
+    assert len(built) <= 4
+    assert "scope:1" not in result["Role=large"]
+    assert "scope:1999" not in result["Role=large"]
+    assert "scope:2" in result["Role=large"]
+    assert "assume:small" in result["Role=large"]
+    assert len(result["Role=large"]) == 3001 - 1111
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("seed", range(20))
+async def test_minimize_scopes_preserves_expansion(seed):
+    rng = random.Random(seed)
+
+    def name():
+        return rng.choice("abcdef")
+
+    def scope():
+        if rng.random() < 0.5:
+            return "assume:" + name() + rng.choice(["", "*"])
+        return rng.choice(["x", "y", "z"]) + rng.choice(["", "*", ":1"])
+
+    roles = [
+        Role(
+            roleId=roleId,
+            description="",
+            scopes=[scope() for _ in range(rng.randint(0, 4))],
+        )
+        for roleId in sorted(set(name() + rng.choice(["", "*"]) for _ in range(6)))
+    ]
+    clients = [
+        Client(
+            clientId="c{}".format(i),
+            description="",
+            scopes=[scope() for _ in range(3)],
+        )
+        for i in range(3)
+    ]
+    resources = Resources(roles + clients, managed=[".*"])
+
+    def expanded(scopes_by_id):
+        roles = {id[5:]: s for id, s in scopes_by_id.items() if id.startswith("Role=")}
+        resolver = Resolver(roles)
+        return {
+            id: resolver.expandScopes(
+                ["assume:" + id[5:]] if id.startswith("Role=") else scopes
+            )
+            for id, scopes in scopes_by_id.items()
+        }
+
+    before = {r.id: list(r.scopes) for r in resources}
+    after = await minimized(resources)
+    assert expanded(after) == expanded(before)
@@ -5,6 +5,7 @@
 # obtain one at http://mozilla.org/MPL/2.0/.
 
 import pytest
+import tcadmin.resources.client
 import textwrap
 
 from tcadmin.resources.resources import Resource
@@ -77,6 +78,28 @@ def test_client_merge_normalized():
     assert merged.scopes == ("a", "b*", "c*")
 
 
+def test_client_merge_all(mocker):
+    "Many fragments are merged with a single normalization"
+    normalizeScopes = mocker.spy(tcadmin.resources.client, "normalizeScopes")
+    fragments = [
+        Client(clientId="client", description="test", scopes=[s]) for s in ["c", "b*", "a", "bc"]
+    ]
+    merged = fragments[0].merge_all(fragments[1:])
+    assert merged.clientId == "client"
+    assert merged.scopes == ("a", "b*", "c")
+    assert normalizeScopes.call_count == 1
+
+
+def test_client_merge_all_different_descr():
+    "Descriptions must match to merge many fragments"
+    r1 = Client(clientId="client", description="test1", scopes=["a"])
+    r2 = Client(clientId="client", description="test1", scopes=["b"])
+    r3 = Client(clientId="client", description="test2", scopes=["c"])
+    with pytest.raises(RuntimeError) as exc:
+        r1.merge_all([r2, r3])
+    assert "Descriptions for Client=client to be merged differ" in str(exc.value)
+
+
 def test_client_merge_different_descr():
     "Descriptions must match to merge"
     r1 = Client(clientId="client", description="test1", scopes=["a"])
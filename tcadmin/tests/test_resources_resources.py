@@ -5,6 +5,8 @@
 # obtain one at http://mozilla.org/MPL/2.0/.
 
 import json
+import hashlib
+import time
 import attr
 import pytest
 import textwrap
@@ -134,6 +136,22 @@ def test_resource_formatter():
     )
 
 
+def test_resource_digest():
+    "Resources with the same content have the same digest"
+    assert Thing("a", "V").digest == Thing("a", "V").digest
+    assert Thing("a", "V").digest != Thing("a", "W").digest
+    assert Thing("a", "V").digest != MergeableThing("a", "V").digest
+
+
+def test_resource_digest_cached():
+    "A resource's digest is computed once"
+    a = ListThing("a", ["x"])
+    digest = a.digest
+    a.things.append("y")
+    assert a.digest == digest
+    assert ListThing("a", ["x", "y"]).digest != digest
+
+
 def test_resources_sorted():
     "Resources are always sorted"
     coll = Resources([Thing("z", "3"), Thing("x", "1"), Thing("y", "2")], ["Thing=*"])
@@ -147,6 +165,102 @@ def test_resources_filter():
     assert [r.thingId for r in coll] == ["abc", "abd"]
 
 
+def test_resources_filter_anchored():
+    coll = Resources(
+        [
+            Thing("abc", "3"),
+            Thing("abd", "1"),
+            Thing("dbc", "2"),
+            ListThing("abc", []),
+            MergeableThing("abc", "1"),
+        ],
+        [".*"],
+    ).filter("^Thing=ab[c-z]")
+    assert [r.id for r in coll] == ["Thing=abc", "Thing=abd"]
+
+
+def test_resources_filter_anchored_alternation():
+    coll = Resources(
+        [Thing("abc", "3"), Thing("dbc", "2"), ListThing("abc", [])], [".*"]
+    ).filter("^Thing=d|^List")
+    assert [r.id for r in coll] == ["ListThing=abc", "Thing=dbc"]
+
+
+def test_resources_map():
+    coll = Resources([Thing("a", "1"), Thing("b", "2")], ["Thing=*"]).map(
+        lambda r: r.evolve(value=r.value + "0")
+    )
+    assert list(coll) == [Thing("a", "10"), Thing("b", "20")]
+
+
+def test_resources_map_unmanaged_prohibited():
+    "A map producing an unmanaged resource is an error"
+    coll = Resources([Thing("a", "1")], ["Thing=a"]).map(
+        lambda r: r.evolve(thingId="b")
+    )
+    with pytest.raises(RuntimeError) as exc:
+        list(coll)
+    assert "unmanaged resources: Thing=b" in str(exc.value)
+
+
+def test_resources_view_chain():
+    "Chained filters and maps are applied together, in order, when first used"
+    calls = []
+
+    def double(r):
+        calls.append(r.thingId)
+        return r.evolve(value=r.value * 2)
+
+    coll = Resources(
+        [Thing("abc", "3"), Thing("abd", "1"), Thing("dbc", "2")], ["Thing=*"]
+    )
+    view = coll.filter("^Thing=ab").map(double).filter("d$").map(double)
+    assert calls == []
+    assert list(view) == [Thing("abd", "1111")]
+    assert calls == ["abc", "abd", "abd"]
+    assert list(view) == [Thing("abd", "1111")]
+    assert len(calls) == 3
+
+
+def test_resources_view_independent():
+    "Views are not affected by later changes to their source, and vice versa"
+    coll = Resources([Thing("a", "1")], [".*"])
+    view = coll.filter("Thing")
+    coll.add(Thing("b", "1"))
+    assert list(view) == [Thing("a", "1")]
+    view.add(Thing("c", "1"))
+    assert list(coll) == [Thing("a", "1"), Thing("b", "1")]
+    assert list(view) == [Thing("a", "1"), Thing("c", "1")]
+
+
+def test_resources_of_kind():
+    "Resources of a single kind can be retrieved, in order"
+    coll = Resources(
+        [
+            Thing("b", "2"),
+            ListThing("lt", []),
+            MergeableThing("a", "1"),
+            Thing("a", "1"),
+        ],
+        [".*"],
+    )
+    assert coll.of_kind(Thing) == [Thing("a", "1"), Thing("b", "2")]
+    assert coll.of_kind("ListThing") == [ListThing("lt", [])]
+    assert coll.of_kind("Role") == []
+
+
+def test_resources_fingerprint():
+    "Resources fingerprints reflect the content of the whole collection or one kind"
+    coll1 = Resources([Thing("a", "1"), ListThing("l", ["x"])], [".*"])
+    coll2 = Resources([ListThing("l", ["x"]), Thing("a", "1")], [".*"])
+    assert coll1.fingerprint() == coll2.fingerprint()
+    coll2.add(Thing("b", "1"))
+    assert coll1.fingerprint() != coll2.fingerprint()
+    assert coll1.fingerprint(Thing) != coll2.fingerprint(Thing)
+    assert coll1.fingerprint("ListThing") == coll2.fingerprint("ListThing")
+    assert coll1.fingerprint("Role") == Resources().fingerprint("Role")
+
+
 def test_resources_merge():
     "Resources merge when added"
     coll = Resources([], [".*"])
@@ -155,6 +269,113 @@ def test_resources_merge():
     assert coll.resources[0] == MergeableThing(thingId="a", value="artichoke|aardvark")
 
 
+def test_resources_bulk():
+    "Resources added in bulk are merged and sorted when the block exits"
+    coll = Resources([MergeableThing(thingId="b", value="bat")], [".*"])
+    with coll.bulk():
+        coll.add(MergeableThing(thingId="c", value="cat"))
+        coll.add(MergeableThing(thingId="b", value="bee"))
+        coll.add(MergeableThing(thingId="a", value="ant"))
+        coll.add(MergeableThing(thingId="b", value="boar"))
+        assert len(coll._pending) == 3
+    assert list(coll) == [
+        MergeableThing(thingId="a", value="ant"),
+        MergeableThing(thingId="b", value="bat|bee|boar"),
+        MergeableThing(thingId="c", value="cat"),
+    ]
+
+
+def test_resources_bulk_nested():
+    "Resources added in nested bulk blocks are added when the outermost block exits"
+    coll = Resources([], [".*"])
+    with coll.bulk():
+        with coll.bulk():
+            coll.add(Thing("x", "1"))
+        assert coll._pending
+    assert not coll._pending
+    assert list(coll) == [Thing("x", "1")]
+
+
+def test_resources_bulk_nested_failure():
+    "Resources added in a nested bulk block that raises are discarded"
+    coll = Resources([], [".*"])
+    with coll.bulk():
+        coll.add(MergeableThing(thingId="a", value="ant"))
+        try:
+            with coll.bulk():
+                coll.add(MergeableThing(thingId="a", value="asp"))
+                coll.add(MergeableThing(thingId="b", value="bee"))
+                raise ValueError("uhoh")
+        except ValueError:
+            pass
+        coll.add(MergeableThing(thingId="c", value="cat"))
+    assert list(coll) == [
+        MergeableThing(thingId="a", value="ant"),
+        MergeableThing(thingId="c", value="cat"),
+    ]
+
+
+def test_resources_bulk_nested_failure_after_read():
+    "Resources added in a failed nested bulk block after a read are discarded"
+    coll = Resources([], [".*"])
+    with coll.bulk():
+        try:
+            with coll.bulk():
+                coll.add(Thing("a", "1"))
+                assert list(coll) == [Thing("a", "1")]
+                coll.add(Thing("b", "1"))
+                raise ValueError("uhoh")
+        except ValueError:
+            pass
+    assert list(coll) == [Thing("a", "1")]
+
+
+def test_resources_bulk_read():
+    "Resources added in bulk are visible when the collection is read"
+    coll = Resources([], [".*"])
+    with coll.bulk():
+        coll.add(MergeableThing(thingId="a", value="ant"))
+        assert list(coll) == [MergeableThing(thingId="a", value="ant")]
+        coll.add(MergeableThing(thingId="a", value="asp"))
+    assert list(coll) == [MergeableThing(thingId="a", value="ant|asp")]
+
+
+def test_resources_bulk_views():
+    "Resources added in bulk are included in views taken within the block"
+    coll = Resources([], [".*"])
+    with coll.bulk():
+        coll.add(Thing("a", "1"))
+        coll.add(ListThing("l", []))
+        filtered = coll.filter("^Thing=")
+        mapped = coll.map(lambda r: r)
+        coll.add(Thing("b", "1"))
+    assert list(filtered) == [Thing("a", "1")]
+    assert list(mapped) == [ListThing("l", []), Thing("a", "1")]
+    assert list(coll) == [ListThing("l", []), Thing("a", "1"), Thing("b", "1")]
+
+
+def test_resources_bulk_unmanaged_prohibited():
+    "Adding an unmanaged resource in bulk is an error immediately"
+    coll = Resources([], ["Thing=x"])
+    with pytest.raises(RuntimeError) as exc:
+        with coll.bulk():
+            coll.add(Thing("x", "1"))
+            coll.add(Thing("y", "1"))
+    assert "unmanaged resource: Thing=y" in str(exc.value)
+    assert list(coll) == []
+
+
+def test_resources_bulk_merge_failure():
+    "A failed merge at the end of a bulk block leaves the collection unchanged"
+    coll = Resources([Thing("x", "1")], [".*"])
+    with pytest.raises(RuntimeError) as exc:
+        with coll.bulk():
+            coll.add(Thing("w", "1"))
+            coll.add(Thing("x", "2"))
+    assert "Cannot merge resources of kind Thing" in str(exc.value)
+    assert list(coll) == [Thing("x", "1")]
+
+
 def test_resources_to_json():
     "Resources.to_json produces the expected data structure"
     rsrcs = Resources(
@@ -187,6 +408,116 @@ def test_resources_from_json():
     )
 
 
+@pytest.fixture
+def all_kinds(appconfig):
+    from tcadmin.resources import Role, Client, Hook, Binding, WorkerPool, Secret
+
+    return Resources(
+        [
+            Role(roleId="r", description="a role", scopes=["a", "b"]),
+            Client(clientId="c", description="a client", scopes=["c"]),
+            Hook(
+                hookGroupId="g",
+                hookId="h",
+                name="n",
+                description="a hook",
+                owner="o",
+                emailOnError=False,
+                schedule=["0 0 * * *"],
+                bindings=[Binding(exchange="e", routingKeyPattern="#")],
+                task={"payload": {"x": [1, 2]}},
+                triggerSchema={},
+            ),
+            WorkerPool(
+                workerPoolId="p/w",
+                description="a pool",
+                owner="o",
+                config={"launchConfigs": []},
+                emailOnError=True,
+                providerId="aws",
+            ),
+            Secret(name="s1", secret={"password": "hunter2"}),
+            Secret(name="s2"),
+        ],
+        [".*"],
+    )
+
+
+def test_resources_snapshot(all_kinds):
+    "Resources survive a round trip through a snapshot, with secret values digested"
+    from tcadmin.resources.secret import NoSecret, SecretDigest
+
+    loaded = Resources.from_snapshot(all_kinds.to_snapshot())
+    assert list(loaded.managed) == [".*"]
+    assert [r.id for r in loaded] == [r.id for r in all_kinds]
+    for before, after in zip(all_kinds, loaded):
+        if before.kind != "Secret":
+            assert before == after
+    s1, s2 = loaded.of_kind("Secret")
+    assert s1.secret == SecretDigest.of({"password": "hunter2"}, s1.secret.salt)
+    assert not s1.has_secret()
+    assert str(s1) == str(all_kinds.of_kind("Secret")[0].digested(s1.secret.salt))
+    assert s2.secret is NoSecret
+
+
+def test_resources_snapshot_secret_salt(all_kinds):
+    "Each snapshot digests secret values with its own salt"
+    s1 = Resources.from_snapshot(all_kinds.to_snapshot()).of_kind("Secret")[0]
+    s2 = Resources.from_snapshot(all_kinds.to_snapshot()).of_kind("Secret")[0]
+    assert s1.secret.salt != s2.secret.salt
+    assert s1.secret.digest != s2.secret.digest
+    unsalted = hashlib.sha256(b'{"password": "hunter2"}').hexdigest()
+    assert unsalted not in (s1.secret.digest, s2.secret.digest)
+
+
+def test_resources_snapshot_secret_salts_differ(all_kinds):
+    "Secrets loaded from different snapshots cannot be snapshotted together"
+    s1 = Resources.from_snapshot(all_kinds.to_snapshot()).of_kind("Secret")[0]
+    s2 = Resources.from_snapshot(all_kinds.to_snapshot()).of_kind("Secret")[0]
+    coll = Resources([s1, s2.evolve(name="s3")], [".*"])
+    with pytest.raises(ValueError) as exc:
+        coll.to_snapshot()
+    assert "different salts" in str(exc.value)
+
+
+def test_resources_snapshot_reload(all_kinds):
+    "Snapshotting a loaded snapshot reproduces it"
+    snapshot = all_kinds.to_snapshot()
+    assert Resources.from_snapshot(snapshot).to_snapshot() == snapshot
+
+
+def test_resources_snapshot_invalid():
+    with pytest.raises(ValueError) as exc:
+        Resources.from_snapshot(b'{"resources": []}')
+    assert "not a tc-admin snapshot" in str(exc.value)
+    with pytest.raises(ValueError) as exc:
+        Resources.from_snapshot(Resources().to_snapshot().replace(b"t\x02", b"t\x63"))
+    assert "unsupported snapshot version 99" in str(exc.value)
+
+
+@pytest.mark.slow
+def test_resources_snapshot_benchmark(appconfig):
+    "Loading a snapshot of 20k resources is fast"
+    from tcadmin.resources import Role
+
+    rsrcs = Resources(
+        [
+            Role(roleId="role-{}".format(i), description="", scopes=["a", "b:*"])
+            for i in range(20000)
+        ],
+        ["Role="],
+    )
+    snapshot = rsrcs.to_snapshot()
+    start = time.perf_counter()
+    loaded = Resources.from_snapshot(snapshot)
+    print(
+        "loaded {} bytes in {:.2f}s".format(
+            len(snapshot), time.perf_counter() - start
+        )
+    )
+    assert loaded == rsrcs
+
+
 def test_resources_add_unmanaged_prohibited():
     "Adding an unmanaged resource is an error"
     with pytest.raises(RuntimeError) as exc:
@@ -225,6 +556,29 @@ def test_resources_verify_unmanaged_prohibited():
     assert "unmanaged resources: ListThing=y" in str(exc.value)
 
 
+def test_resources_verify_replaced_managed():
+    "Replacing `managed` causes the next verification to check every resource"
+    rsrcs = Resources([Thing("x", "1")], ["Thing=*"])
+    rsrcs.managed = Resources([], ["OtherStuff"]).managed
+    with pytest.raises(RuntimeError) as exc:
+        str(rsrcs)
+    assert "unmanaged resources: Thing=x" in str(exc.value)
+
+
+@pytest.mark.slow
+def test_resources_add_one_at_a_time_benchmark(mocker):
+    "Adding resources one at a time checks each resource against `managed` once"
+    rsrcs = Resources([], ["Thing="])
+    matches = mocker.spy(rsrcs.managed, "matches")
+    start = time.perf_counter()
+    for i in range(50000):
+        rsrcs.add(Thing("t{:05d}".format(i), "v"))
+    print("added 50000 resources in {:.2f}s".format(time.perf_counter() - start))
+    assert matches.call_count == 50000
+    rsrcs.to_json()
+    assert matches.call_count == 50000
+
+
 def test_resources_str():
     "Resources are stringified in order"
     resources = Resources(
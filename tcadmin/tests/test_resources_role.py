@@ -4,8 +4,12 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file, You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 
+import attr
+import time
 import pytest
+import tcadmin.resources.role
 import textwrap
+import tracemalloc
 
 from tcadmin.resources.resources import Resource
 from tcadmin.resources.role import Role
@@ -14,6 +18,14 @@ from tcadmin.resources.role import Role
 pytestmark = pytest.mark.usefixtures("appconfig")
 
 
+@attr.s
+class UnslottedRole(Resource):
+    "A copy of Role's fields without slots, for comparison"
+    roleId = attr.ib(type=str)
+    description = attr.ib(type=str)
+    scopes = attr.ib(type=tuple)
+
+
 def test_role_formatter():
     "Roles are properly formatted with a string, including the description preamble and sorted scopes"
     role = Role("my:role-id", "This is my role", ["b", "a", "c"])
@@ -77,6 +89,28 @@ def test_role_merge_normalized():
     assert merged.scopes == ("a", "b*", "c*")
 
 
+def test_role_merge_all(mocker):
+    "Many fragments are merged with a single normalization"
+    normalizeScopes = mocker.spy(tcadmin.resources.role, "normalizeScopes")
+    fragments = [
+        Role(roleId="role", description="test", scopes=[s]) for s in ["c", "b*", "a", "bc"]
+    ]
+    merged = fragments[0].merge_all(fragments[1:])
+    assert merged.roleId == "role"
+    assert merged.scopes == ("a", "b*", "c")
+    assert normalizeScopes.call_count == 1
+
+
+def test_role_merge_all_different_descr():
+    "Descriptions must match to merge many fragments"
+    r1 = Role(roleId="role", description="test1", scopes=["a"])
+    r2 = Role(roleId="role", description="test1", scopes=["b"])
+    r3 = Role(roleId="role", description="test2", scopes=["c"])
+    with pytest.raises(RuntimeError) as exc:
+        r1.merge_all([r2, r3])
+    assert "Descriptions for Role=role to be merged differ" in str(exc.value)
+
+
 def test_role_merge_different_descr():
     "Descriptions must match to merge"
     r1 = Role(roleId="role", description="test1", scopes=["a"])
@@ -84,3 +118,47 @@ def test_role_merge_different_descr():
     with pytest.raises(RuntimeError) as exc:
         r1.merge(r2)
     assert "Descriptions for Role=role to be merged differ" in str(exc.value)
+
+
+def test_role_slotted():
+    "Roles have no per-instance __dict__ and compute their id once"
+    role = Role("my:role-id", "This is my role", ["b", "a", "c"])
+    assert not hasattr(role, "__dict__")
+    assert role.id is role.id
+
+
+@pytest.mark.slow
+def test_role_memory_benchmark():
+    "100k slotted roles use less memory than the same roles with a __dict__"
+    count = 100000
+    role_ids = ["role-{}".format(i) for i in range(count)]
+    scopes = ("scope-a", "scope-b")
+
+    def measure(cls):
+        tracemalloc.start()
+        try:
+            roles = [
+                cls._construct_without_converters(
+                    roleId=roleId, description="d", scopes=scopes
+                )
+                for roleId in role_ids
+            ]
+            size = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+        start = time.perf_counter()
+        for role in roles:
+            role.id
+        cached = time.perf_counter() - start
+        start = time.perf_counter()
+        for role in roles:
+            role._make_id()
+        formatted = time.perf_counter() - start
+        print(
+            "{}: {} bytes per role; 100k ids in {:.3f}s cached, {:.3f}s formatted".format(
+                cls.__name__, size // count, cached, formatted
+            )
+        )
+        return size
+
+    assert measure(Role) < measure(UnslottedRole)
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from tcadmin.rolecosts import role_costs
+from tcadmin.resources import Resources, Role
+from tcadmin.util.ansi import strip_ansi
+
+
+pytestmark = pytest.mark.usefixtures("appconfig")
+
+
+def make_resources(roles):
+    return Resources(
+        [Role(roleId=id, description="", scopes=scopes) for id, scopes in roles],
+        managed=[".*"],
+    )
+
+
+def test_role_costs():
+    current = make_resources([("a", ["assume:b"]), ("b", ["x"])])
+    generated = make_resources([("a", ["assume:b", "y"]), ("b", ["x"])])
+    lines = strip_ansi(role_costs(generated, current)).split("\n")
+    assert lines[1].split() == ["4", "1", "1", "a"]
+    assert lines[2].split() == ["2", "0", "0", "b"]
+    assert lines[-2] == "total closure size: 5 current, 6 generated"
+    assert lines[-1].startswith("warning:")
+
+
+def test_role_costs_top_current():
+    current = make_resources([("a", ["assume:b"]), ("b", ["assume:a"])])
+    generated = make_resources([("a", [])])
+    lines = role_costs(generated, current, top=1, use_generated=False).split("\n")
+    assert lines[1].split() == ["2", "0", "1", "2", "a"]
+    assert lines[2:] == ["", "total closure size: 4 current, 1 generated"]
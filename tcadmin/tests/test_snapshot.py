@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from tcadmin.options import test_options as with_test_options
+from tcadmin.resources import Resources, Role
+from tcadmin.snapshot import load_snapshot, save_snapshot
+
+
+pytestmark = pytest.mark.usefixtures("appconfig")
+
+
+def test_snapshot_not_requested():
+    "Without the options, nothing is loaded or saved"
+    with with_test_options(snapshot_in=None, snapshot_out=None):
+        assert load_snapshot() is None
+        save_snapshot(Resources())
+
+
+def test_snapshot_save_and_load(tmp_path):
+    "Resources saved with --snapshot-out can be loaded with --snapshot-in"
+    path = str(tmp_path / "snapshot")
+    resources = Resources(
+        [Role(roleId="r", description="d", scopes=["s"])], ["Role=r$"]
+    )
+    with with_test_options(snapshot_in=None, snapshot_out=path):
+        save_snapshot(resources)
+    with with_test_options(snapshot_in=path, snapshot_out=None):
+        assert load_snapshot() == resources
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+import random
+
+from tcadmin.util.grants import GrantIndex
+from tcadmin.util.scopes import Resolver, ScopeSet
+from tcadmin.resources import Resources, Role, Client
+
+
+pytestmark = pytest.mark.usefixtures("appconfig")
+
+
+def test_who_grants_chain():
+    index = GrantIndex(
+        roles={
+            "level-3": ["assume:base", "l3"],
+            "base": ["queue:create-task:*"],
+            "other": ["assume:base"],
+        },
+        clients={"ci": ["assume:level-3"], "admin": ["*"], "none": ["x"]},
+    )
+    assert index.who_grants("queue:create-task:highest/foo") == [
+        ("Client=admin", ["*"]),
+        ("Client=ci", ["assume:level-3", "assume:base", "queue:create-task:*"]),
+        ("Role=base", ["queue:create-task:*"]),
+        ("Role=level-3", ["assume:base", "queue:create-task:*"]),
+        ("Role=other", ["assume:base", "queue:create-task:*"]),
+    ]
+
+
+def test_who_grants_parameterized():
+    index = GrantIndex(
+        roles={
+            "repo:github.com/*": ["assume:project:<..>"],
+            "project:proj/*": ["secrets:get:proj/<..>"],
+        },
+        clients={
+            "proj-ci": ["assume:repo:github.com/proj/ci"],
+            "proj-other": ["assume:repo:github.com/proj/other"],
+            "all-repos": ["assume:repo:github.com/*"],
+        },
+    )
+    via_repo = ["assume:project:<..>", "secrets:get:proj/<..>"]
+    assert index.who_grants("secrets:get:proj/ci") == [
+        ("Client=all-repos", ["assume:repo:github.com/*"] + via_repo),
+        ("Client=proj-ci", ["assume:repo:github.com/proj/ci"] + via_repo),
+        ("Role=project:proj/*", ["secrets:get:proj/<..>"]),
+        ("Role=repo:github.com/*", via_repo),
+    ]
+
+
+def test_who_grants_star_before_parameter():
+    "A template with `*` before `<..>` and an empty parameter grants a shorter star scope"
+    index = GrantIndex(roles={"a": [], "a*": ["b*<..>"]}, clients={})
+    assert index.who_grants("bs") == [("Role=a", ["assume:a", "b*<..>"])]
+
+
+def test_who_grants_from_resources():
+    resources = Resources(
+        [
+            Role(roleId="base", description="", scopes=["s"]),
+            Client(clientId="c", description="", scopes=["assume:base"]),
+        ],
+        managed=[".*"],
+    )
+    index = GrantIndex.from_resources(resources)
+    assert [id for id, _ in index.who_grants("s")] == ["Client=c", "Role=base"]
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_who_grants_matches_expansion(seed):
+    rng = random.Random(seed)
+
+    def name():
+        return "".join(rng.choice("ab:") for _ in range(rng.randint(0, 3)))
+
+    def scope():
+        s = rng.choice(["assume:", "assume:", "x:", "assu"]) + name()
+        if rng.random() < 0.3:
+            s += rng.choice(["", "*"]) + "<..>" + rng.choice(["", "", ":", "b"])
+        if rng.random() < 0.3:
+            s += "*"
+        return s
+
+    roles = {
+        name() + rng.choice(["", "*"]): [scope() for _ in range(rng.randint(0, 3))]
+        for _ in range(15)
+    }
+    clients = {
+        "c{}".format(i): [scope() for _ in range(rng.randint(1, 2))] for i in range(10)
+    }
+    resolver = Resolver(roles)
+    try:
+        expanded = {"Role=" + r: resolver.expandScopes(["assume:" + r]) for r in roles}
+        expanded.update(
+            {"Client=" + c: resolver.expandScopes(s) for c, s in clients.items()}
+        )
+    except RuntimeError:
+        pytest.skip("role graph exceeds the depth limit")
+
+    index = GrantIndex(roles, clients)
+    targets = sorted(set(s for scopes in expanded.values() for s in scopes))
+    for target in targets:
+        target = target.replace("*", "")
+        expected = sorted(
+            id for id, scopes in expanded.items() if ScopeSet(scopes).satisfies(target)
+        )
+        assert [id for id, _ in index.who_grants(target)] == expected, target
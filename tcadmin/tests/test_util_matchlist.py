@@ -4,7 +4,12 @@
 # v. 2.0. If a copy of the MPL was not distributed with this file, You can
 # obtain one at http://mozilla.org/MPL/2.0/.
 
-from tcadmin.util.matchlist import MatchList
+import re
+import time
+import pytest
+
+from tcadmin.util import matchlist
+from tcadmin.util.matchlist import MatchList, literal_prefix
 
 
 def test_MatchList_iter():
@@ -28,3 +33,149 @@ def test_MatchList_match_rooted():
     ml = MatchList(["ab+"])
     assert ml.matches("abc")
     assert not ml.matches("xabc")
+
+
+def test_MatchList_empty():
+    ml = MatchList([])
+    assert not ml.matches("")
+    assert not ml.matches("abc")
+
+
+def test_MatchList_add_after_match():
+    ml = MatchList(["a"])
+    assert not ml.matches("b")
+    ml.add("b$")
+    assert ml.matches("b")
+    assert not ml.matches("bc")
+
+
+def test_MatchList_backreference():
+    ml = MatchList(["(x)y", "(a)\\1"])
+    assert ml._combined is None
+    assert ml.matches("aa")
+    assert not ml.matches("ax")
+
+
+def test_MatchList_conditional():
+    ml = MatchList(["(a)?b", "Role=(x)?(?(1)y|z)"])
+    assert ml._combined is None
+    assert ml.matches("Role=xy")
+    assert ml.matches("Role=z")
+    assert not ml.matches("Role=xz")
+
+
+def test_MatchList_inline_flags():
+    ml = MatchList(["a", "(?i)b"])
+    assert ml.matches("B")
+    assert not ml.matches("c")
+
+
+def test_MatchList_inline_flags_not_combined():
+    ml = MatchList(["Role=abc$", "(?i)Secret=x"])
+    assert ml._combined is None
+    assert ml.matches("secret=X")
+    assert not ml.matches("Role=ABC")
+
+
+def test_MatchList_scoped_flags_combined():
+    ml = MatchList(["Role=abc$", "(?i:Secret=x)"])
+    assert ml._combined is not None
+    assert ml.matches("secret=X")
+    assert not ml.matches("Role=ABC")
+
+
+def test_MatchList_memo_bounded(monkeypatch):
+    monkeypatch.setattr(matchlist, "MEMO_SIZE", 2)
+    ml = MatchList(["a"])
+    for item in ["a", "b", "c", "ab"]:
+        ml.matches(item)
+    assert list(ml._memo) == ["c", "ab"]
+
+
+@pytest.mark.parametrize(
+    "patterns,prefix,result",
+    [
+        (["Hook=garbage/.*"], "Hook=garbage/", True),
+        (["Hook=garb.*"], "Hook=garbage/", True),
+        (["Hook=garbage/test1$"], "Hook=garbage/", True),
+        (["Hook=project\\.x/.*"], "Hook=project.x/", True),
+        (["Hook=garbage/.*"], "Hook=imbstack/", False),
+        (["Role=.*", "Client=.*"], "Secret=", False),
+        (["(Role|Secret)=.*"], "Secret=", True),
+        ([".*"], "Secret=", True),
+        ([], "Secret=", False),
+    ],
+)
+def test_MatchList_could_match(patterns, prefix, result):
+    assert MatchList(patterns).could_match(prefix) == result
+
+
+@pytest.mark.parametrize(
+    "patterns,prefixes",
+    [
+        (["^Client=project/releng/.*"], ["project/releng/"]),
+        (
+            ["Client=project/releng/x$", "Client=project/rel.*", "Client=static/.*"],
+            ["project/rel", "static/"],
+        ),
+        (["Client=a$", "Client=ab$", "Role=.*"], ["a"]),
+        (["Client=project/.*", "Client=\\w+"], [""]),
+        ([".*"], [""]),
+        (["Role=.*"], []),
+    ],
+)
+def test_MatchList_prefixes(patterns, prefixes):
+    assert MatchList(patterns).prefixes("Client=") == prefixes
+
+
+@pytest.mark.slow
+def test_MatchList_benchmark():
+    patterns = ["Role=project:team{}/.*".format(i) for i in range(300)] + [
+        "Client=project/team{}/[^/]*$".format(i) for i in range(300)
+    ]
+    items = ["Role=project:team{}/x".format(i) for i in range(0, 1000, 3)] + [
+        "Client=project/team{}/x/y".format(i) for i in range(0, 1000, 3)
+    ]
+    ml = MatchList(patterns)
+    regexps = [re.compile(p) for p in patterns]
+
+    start = time.monotonic()
+    expected = [any(r.match(i) for r in regexps) for i in items]
+    linear = time.monotonic() - start
+
+    start = time.monotonic()
+    assert [ml.matches(i) for i in items] == expected
+    combined = time.monotonic() - start
+
+    start = time.monotonic()
+    assert [ml.matches(i) for i in items] == expected
+    memoized = time.monotonic() - start
+
+    print(
+        "linear: {:.3f}s, combined: {:.3f}s, memoized: {:.3f}s".format(
+            linear, combined, memoized
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "pattern,prefix",
+    [
+        ("Role=repo:hg/mozilla-central", "Role=repo:hg/mozilla-central"),
+        ("Role=repo:github\\.com/.*", "Role=repo:github.com/"),
+        ("Role=repo:github.com/.*", "Role=repo:github"),
+        ("Client=ab*c", "Client=a"),
+        ("Client=ab?c", "Client=a"),
+        ("Client=ab{2}", "Client=a"),
+        ("Client=ab+c", "Client=ab"),
+        ("Client=[ab]", "Client="),
+        ("Client=\\d+", "Client="),
+        ("Client=(a|b)", ""),
+        ("Role=a|Client=b", ""),
+        ("(?i)role", ""),
+        ("^Client=a.*", "Client=a"),
+        ("", ""),
+    ],
+)
+def test_literal_prefix(pattern, prefix):
+    assert literal_prefix(pattern) == prefix
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+from tcadmin.util.rolecosts import RoleCost, analyze_roles, total_closure
+
+
+def test_analyze_chain():
+    costs = analyze_roles(
+        {"a": ["assume:b", "assume:c"], "b": ["assume:c", "x"], "c": ["y", "z"]}
+    )
+    assert costs == {
+        "a": RoleCost(roleId="a", component=1, depth=2, fan_out=2, closure=6),
+        "b": RoleCost(roleId="b", component=1, depth=1, fan_out=1, closure=5),
+        "c": RoleCost(roleId="c", component=1, depth=0, fan_out=0, closure=3),
+    }
+    assert total_closure(costs) == 14
+
+
+def test_analyze_cycle():
+    costs = analyze_roles(
+        {"a": ["assume:b"], "b": ["assume:a", "assume:c"], "c": ["x"], "d": []}
+    )
+    assert [(c.component, c.depth) for _, c in sorted(costs.items())] == [
+        (2, 1),
+        (2, 1),
+        (1, 0),
+        (1, 0),
+    ]
+    assert costs["a"].closure == costs["b"].closure == 4
+
+
+def test_analyze_star_roles():
+    costs = analyze_roles(
+        {
+            "repo:*": ["assume:project:<..>"],
+            "project:*": ["secrets:<..>"],
+            "ci": ["assume:repo:x"],
+        }
+    )
+    assert costs["ci"].fan_out == 1
+    assert costs["ci"].depth == 2
+    assert costs["ci"].closure == 4
+
+
+def test_analyze_wide_star():
+    costs = analyze_roles({"admin": ["assume:*"], "a": ["x"], "b": ["y"]})
+    assert costs["admin"].fan_out == 2
+    assert costs["admin"].depth == 1
@@ -7,9 +7,18 @@
 import pytest
 import taskcluster
 import os
-
-from tcadmin.util.scopes import Resolver, satisfies
-from tcadmin.resources import Role, Resources
+import random
+import re
+import time
+
+from tcadmin.util.scopes import (
+    Resolver,
+    ScopeSet,
+    satisfies,
+    normalizeScopes,
+    expand_all,
+)
+from tcadmin.resources import Role, Client, Resources
 
 
 pytestmark = pytest.mark.usefixtures("appconfig")
@@ -27,6 +36,103 @@ def test_from_resources():
     assert sorted(res.expandScopes(["assume:role1"])) == ["assume:role1", "one"]
 
 
+def test_expand_all():
+    resources = Resources(
+        resources=[
+            Role(roleId="role1", description="1", scopes=["one", "assume:role2"]),
+            Role(roleId="role2", description="2", scopes=["two"]),
+            Role(roleId="repo:*", description="3", scopes=["repo:<..>"]),
+            Client(clientId="client1", description="c", scopes=["assume:role1"]),
+            Client(clientId="client2", description="c", scopes=["assume:repo:x"]),
+        ],
+        managed=[".*"],
+    )
+    assert expand_all(resources) == {
+        "Role=role1": ["assume:role1", "assume:role2", "one", "two"],
+        "Role=role2": ["assume:role2", "two"],
+        "Role=repo:*": ["assume:repo:*", "repo:*"],
+        "Client=client1": ["assume:role1", "assume:role2", "one", "two"],
+        "Client=client2": ["assume:repo:x", "repo:x"],
+    }
+
+
+def test_expand_all_resolver():
+    resources = Resources(
+        resources=[Client(clientId="c", description="c", scopes=["assume:r"])],
+        managed=[".*"],
+    )
+    resolver = Resolver({"r": ["s"]})
+    assert expand_all(resources, resolver) == {"Client=c": ["assume:r", "s"]}
+
+
+@pytest.mark.parametrize("cache_size", [None, 0])
+def test_expand_many_processes(cache_size):
+    rng = random.Random(1)
+    roles, scope = random_roles(rng, 20)
+    res = Resolver(roles, cache_size=cache_size)
+    scope_lists = []
+    while len(scope_lists) < 30:
+        given = [scope() for _ in range(rng.randint(1, 3))]
+        try:
+            Resolver(roles).expandScopes(given)
+        except RuntimeError:
+            continue
+        scope_lists.append(given)
+    expected = [res.expandScopes(given) for given in scope_lists]
+    assert res.expand_many(scope_lists) == expected
+    assert res.expand_many(scope_lists, processes=2) == expected
+
+
+@pytest.mark.slow
+def test_expand_all_benchmark():
+    roles = []
+    clients = []
+    for i in range(1000):
+        roles.append(
+            Role(
+                roleId="project:proj{}:level-3".format(i),
+                description="",
+                scopes=["assume:project:shared", "queue:route:proj{}.*".format(i)],
+            )
+        )
+        clients.append(
+            Client(
+                clientId="project/proj{}/ci".format(i),
+                description="",
+                scopes=["assume:project:proj{}:level-3".format(i)],
+            )
+        )
+    roles.append(
+        Role(
+            roleId="project:shared",
+            description="",
+            scopes=["shared:{}".format(j) for j in range(200)],
+        )
+    )
+    resources = Resources(resources=roles + clients, managed=[".*"])
+
+    start = time.monotonic()
+    resolver = Resolver.from_resources(resources)
+    expected = {r.id: resolver.expandScopes(["assume:" + r.roleId]) for r in roles}
+    expected.update({c.id: resolver.expandScopes(list(c.scopes)) for c in clients})
+    separate = time.monotonic() - start
+
+    start = time.monotonic()
+    assert expand_all(resources) == expected
+    together = time.monotonic() - start
+
+    start = time.monotonic()
+    assert expand_all(resources, processes=4) == expected
+    processes = time.monotonic() - start
+
+    # the processes only help given several cores
+    print(
+        "separately: {:.3f}s, together: {:.3f}s, 4 processes on {} cores: {:.3f}s".format(
+            separate, together, os.cpu_count(), processes
+        )
+    )
+
+
 def check_resolved(res, given, expected):
     assert sorted(res.expandScopes(given)) == sorted(expected)
 
@@ -227,6 +333,352 @@ def test_normalizeScopes_with_stars():
     )
 
 
+def reference_normalizeScopes(scopes):
+    "The original O(n^2) implementation of normalizeScopes"
+    scopes = set(scopes)
+    return sorted(
+        p1
+        for p1 in scopes
+        if all(
+            p1 == p2 or not (p2.endswith("*") and p1.startswith(p2[:-1]))
+            for p2 in scopes
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "scopes,normalized",
+    [
+        ([], []),
+        (["b", "a", "b"], ["a", "b"]),
+        (["a", "a*"], ["a*"]),
+        (["a!", "a*", "ab"], ["a*"]),
+        (["a*", "ab*", "abc"], ["a*"]),
+        (["ab*", "a", "abc", "b"], ["a", "ab*", "b"]),
+        (["*", "a", "b*"], ["*"]),
+        # `X*` and `X**` each satisfy the other
+        (["a*", "a**"], []),
+        (["a*", "a**", "b"], ["b"]),
+    ],
+)
+def test_normalizeScopes(scopes, normalized):
+    assert normalizeScopes(scopes) == normalized
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_normalizeScopes_matches_reference(seed):
+    rng = random.Random(seed)
+    scopes = [
+        "".join(rng.choice("ab:*") for _ in range(rng.randint(0, 5)))
+        for _ in range(rng.randint(0, 50))
+    ]
+    assert normalizeScopes(scopes) == reference_normalizeScopes(scopes)
+
+
+@pytest.mark.slow
+def test_normalizeScopes_benchmark():
+    rng = random.Random(1)
+    for size in [100, 1000, 5000, 20000]:
+        scopes = [
+            "queue:create-task:proj{}/{}{}".format(
+                rng.randint(0, size // 10),
+                rng.randint(0, 100),
+                "*" if rng.random() < 0.1 else "",
+            )
+            for _ in range(size)
+        ]
+        start = time.monotonic()
+        normalized = normalizeScopes(scopes)
+        sweep = time.monotonic() - start
+        if size <= 5000:
+            start = time.monotonic()
+            assert normalized == reference_normalizeScopes(scopes)
+            reference = "{:.3f}s".format(time.monotonic() - start)
+        else:
+            reference = "-"
+        print("{} scopes: sweep {:.3f}s, reference {}".format(size, sweep, reference))
+
+
+@pytest.mark.parametrize("cache_size", [None, 0])
+def test_expansion_depth_limit(cache_size):
+    roles = {"r{}".format(i): ["assume:r{}".format(i + 1)] for i in range(150)}
+    with pytest.raises(RuntimeError, match="maxium role expansion depth reached"):
+        Resolver(roles, cache_size=cache_size).expandScopes(["assume:r0"])
+    with pytest.raises(RuntimeError, match="maxium role expansion depth reached"):
+        Resolver(roles, cache_size=cache_size).expandScopes(["assume:r50"])
+    # one fewer level is fine
+    assert "assume:r150" in Resolver(roles, cache_size=cache_size).expandScopes(
+        ["assume:r51"]
+    )
+    # as is expanding the end of the chain first
+    res = Resolver(roles, cache_size=cache_size)
+    res.expandScopes(["assume:r51"])
+    with pytest.raises(RuntimeError, match="maxium role expansion depth reached"):
+        res.expandScopes(["assume:r50"])
+
+
+@pytest.mark.parametrize("cache_size", [None, 0])
+def test_expansion_depth_limit_cycle(cache_size):
+    cycle = {"r{}".format(i): ["assume:r{}".format((i + 1) % 150)] for i in range(150)}
+    with pytest.raises(RuntimeError, match="maxium role expansion depth reached"):
+        Resolver(cycle, cache_size=cache_size).expandScopes(["assume:r0"])
+    # a large cycle can still be expanded in few rounds
+    ids = ["r{}".format(i) for i in range(150)]
+    clique = {id: ["assume:" + other for other in ids] for id in ids}
+    assert len(Resolver(clique, cache_size=cache_size).expandScopes(["assume:r0"])) == 150
+
+
+@pytest.mark.parametrize("cache_size", [None, 0])
+def test_expand_many_depth_limit(cache_size):
+    roles = {"r{}".format(i): ["assume:r{}".format(i + 1)] for i in range(150)}
+    with pytest.raises(RuntimeError, match="maxium role expansion depth reached"):
+        Resolver(roles, cache_size=cache_size).expand_many(
+            [["assume:r100"], ["assume:r0"]], processes=2
+        )
+
+
+def reference_expandScopes(roles, scopes):
+    """
+    The original, straightforward implementation of Resolver.expandScopes,
+    comparing every scope to every role in each round.
+    """
+
+    def star_match(star_match, role_scopes):
+        if star_match.endswith("*"):
+            pat = re.compile(r"<\.\.>.*")
+        else:
+            pat = re.compile(r"<\.\.>")
+        return {pat.sub(star_match, rs) for rs in role_scopes}
+
+    scopes = set(scopes)
+    expanded = set()
+    for _ in range(100):
+        prev = set(scopes)
+        for scope in prev:
+            if scope in expanded:
+                continue
+            expanded.add(scope)
+            for role, role_scopes in roles.items():
+                assume = "assume:{}".format(role)
+                if role.endswith("*"):
+                    pfx = assume[:-1]
+                    if scope.startswith(pfx):
+                        scopes.update(star_match(scope[len(pfx):], role_scopes))
+                if scope.endswith("*"):
+                    pfx = scope[:-1]
+                    if assume.startswith(pfx):
+                        if assume.endswith("*"):
+                            scopes.update(star_match("*", role_scopes))
+                        else:
+                            scopes.update(role_scopes)
+                if scope == assume:
+                    scopes.update(role_scopes)
+        if scopes == prev:
+            break
+    else:
+        raise RuntimeError("maxium role expansion depth reached")
+    return normalizeScopes(scopes)
+
+
+def random_roles(rng, num_roles):
+    "Generate a random, tangled set of roles using a small alphabet"
+
+    def name():
+        return "".join(rng.choice("abc:") for _ in range(rng.randint(0, 4)))
+
+    def scope():
+        kind = rng.random()
+        if kind < 0.5:
+            s = "assume:" + name()
+        elif kind < 0.6:
+            s = "assu" + name()
+        else:
+            s = "x:" + name()
+        if rng.random() < 0.2:
+            s += "<..>"
+        if rng.random() < 0.3:
+            s += "*"
+        return s
+
+    roles = {}
+    for _ in range(num_roles):
+        roleId = name() + ("*" if rng.random() < 0.3 else "")
+        roles[roleId] = [scope() for _ in range(rng.randint(0, 2))]
+    return roles, scope
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_expandScopes_matches_reference(seed):
+    rng = random.Random(seed)
+    roles, scope = random_roles(rng, 20)
+    res = Resolver(roles)
+
+    def outcome(expand, *args):
+        try:
+            return expand(*args)
+        except RuntimeError as e:
+            return str(e)
+
+    for _ in range(10):
+        given = [scope() for _ in range(rng.randint(1, 3))]
+        assert outcome(res.expandScopes, given) == outcome(
+            reference_expandScopes, roles, given
+        )
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_expandScopes_cached_matches_reference(seed):
+    rng = random.Random(seed)
+    roles, scope = random_roles(rng, 20)
+    res = Resolver(roles, cache_size=5)
+
+    def outcome(expand, *args):
+        try:
+            return expand(*args)
+        except RuntimeError as e:
+            return str(e)
+
+    for _ in range(10):
+        given = [scope() for _ in range(rng.randint(1, 3))]
+        expected = outcome(reference_expandScopes, roles, given)
+        assert outcome(res.expandScopes, given) == expected
+        assert outcome(res.expandScopes, given) == expected
+
+
+def test_expandScopes_cached_cycle():
+    res = Resolver(
+        {"a": ["assume:b", "x"], "b": ["assume:c", "y"], "c": ["assume:a", "z"]},
+        cache_size=10,
+    )
+    expected = ["assume:a", "assume:b", "assume:c", "x", "y", "z"]
+    assert res.expandScopes(["assume:b"]) == expected
+    # every role in the cycle shares the same closure
+    assert res._closures["assume:a"] is res._closures["assume:c"]
+    assert res.expandScopes(["assume:c"]) == expected
+
+
+def test_expandScopes_cached_copy():
+    res = Resolver({"a": ["x"]}, cache_size=10)
+    expanded = res.expandScopes(["assume:a"])
+    expanded.append("garbage")
+    assert res.expandScopes(["assume:a"]) == ["assume:a", "x"]
+
+
+def test_expandScopes_cached_lru():
+    res = Resolver({"a": ["x"], "b": ["y"]}, cache_size=1)
+    res.expandScopes(["assume:a"])
+    res.expandScopes(["assume:b"])
+    assert list(res._expansions) == [frozenset(["assume:b"])]
+
+
+def test_precompute():
+    res = Resolver({"a": ["assume:b"], "b": ["x"], "c*": ["y"]}, cache_size=10)
+    res.precompute()
+    assert sorted(res._closures) == ["assume:a", "assume:b"]
+    assert res._closures["assume:a"] == {"assume:a", "assume:b", "x"}
+
+
+def test_update_role_invalidates_dependents():
+    res = Resolver(
+        {"a": ["assume:b"], "b": ["x"], "c": ["assume:d"], "d": ["y"]}, cache_size=10
+    )
+    res.precompute()
+    assert res.expandScopes(["assume:a"]) == ["assume:a", "assume:b", "x"]
+    assert res.expandScopes(["assume:c"]) == ["assume:c", "assume:d", "y"]
+    closure_c = res._closures["assume:c"]
+
+    assert res.update_role("b", ["z"]) == {"assume:a", "assume:b"}
+    assert "assume:a" not in res._closures
+    assert res._closures["assume:c"] is closure_c
+    assert list(res._expansions) == [frozenset(["assume:c"])]
+    assert res.expandScopes(["assume:a"]) == ["assume:a", "assume:b", "z"]
+
+
+def test_add_remove_role():
+    res = Resolver({"a": ["assume:b*"]}, cache_size=10)
+    assert res.expandScopes(["assume:a"]) == ["assume:a", "assume:b*"]
+    res.add_role("b1", ["x"])
+    assert res.expandScopes(["assume:a"]) == ["assume:a", "assume:b*", "x"]
+    res.add_role("b*", ["y<..>"])
+    assert res.expandScopes(["assume:a"]) == ["assume:a", "assume:b*", "x", "y*"]
+    assert res.expandScopes(["assume:b2"]) == ["assume:b2", "y2"]
+    res.remove_role("b*")
+    assert res.expandScopes(["assume:a"]) == ["assume:a", "assume:b*", "x"]
+    assert res.expandScopes(["assume:b2"]) == ["assume:b2"]
+    with pytest.raises(RuntimeError):
+        res.add_role("b1", [])
+    with pytest.raises(KeyError):
+        res.remove_role("b*")
+    with pytest.raises(KeyError):
+        res.update_role("b*", [])
+
+
+@pytest.mark.parametrize("seed", range(30))
+def test_role_changes_match_fresh_resolver(seed):
+    rng = random.Random(seed)
+    roles, scope = random_roles(rng, 20)
+    queries = [[scope() for _ in range(rng.randint(1, 3))] for _ in range(10)]
+    res = Resolver(roles, cache_size=100)
+
+    for _ in range(10):
+        fresh = Resolver(roles)
+        for given in queries:
+            try:
+                expected = fresh.expandScopes(given)
+            except RuntimeError:
+                continue  # the depth limit is not the same in cached mode
+            assert res.expandScopes(given) == expected
+
+        roleId, _ = random_roles(rng, 1)[0].popitem()
+        new_scopes = [scope() for _ in range(rng.randint(0, 2))]
+        if roleId in roles and rng.random() < 0.5:
+            del roles[roleId]
+            res.remove_role(roleId)
+        elif roleId in roles:
+            roles[roleId] = new_scopes
+            res.update_role(roleId, new_scopes)
+        else:
+            roles[roleId] = new_scopes
+            res.add_role(roleId, new_scopes)
+
+
+@pytest.mark.slow
+def test_expandScopes_benchmark():
+    roles = {}
+    for i in range(2000):
+        roles["repo:github.com/org/proj{}:*".format(i)] = [
+            "assume:project:proj{}:level-<..>".format(i),
+        ]
+        roles["project:proj{}:level-*".format(i)] = [
+            "queue:create-task:proj{}/<..>".format(i),
+            "assume:worker-type:proj{}-*".format(i),
+        ]
+    clients = [["assume:repo:github.com/org/proj{}:3".format(i)] for i in range(200)]
+
+    start = time.monotonic()
+    expected = [reference_expandScopes(roles, c) for c in clients]
+    reference = time.monotonic() - start
+
+    res = Resolver(roles)
+    start = time.monotonic()
+    assert [res.expandScopes(c) for c in clients] == expected
+    indexed = time.monotonic() - start
+
+    res = Resolver(roles, cache_size=1000)
+    start = time.monotonic()
+    res.precompute()
+    assert [res.expandScopes(c) for c in clients] == expected
+    cold = time.monotonic() - start
+    start = time.monotonic()
+    assert [res.expandScopes(c) for c in clients] == expected
+    warm = time.monotonic() - start
+
+    print(
+        "reference: {:.3f}s, indexed: {:.3f}s, cached: {:.3f}s (cold), "
+        "{:.3f}s (warm)".format(reference, indexed, cold, warm)
+    )
+
+
 @pytest.fixture(scope="module")
 def auth():
     # tests using this fixture need *some* auth service, but it actually
@@ -273,3 +725,77 @@ def test_satisfies_stars():
     assert satisfies(["scope:*", "other:*"], ["scope:xyz"])
     assert satisfies(["scope:*", "other:*"], ["scope:"])
     assert not satisfies(["scope:*", "other:*"], ["scope"])
+
+
+def test_satisfies_star_star():
+    assert satisfies(["*"], ["anything", ""])
+    assert satisfies(["a*"], ["a*", "a**"])
+    assert not satisfies(["a**"], ["a"])
+    assert satisfies([], [])
+
+
+def test_ScopeSet():
+    have = ScopeSet(["scope1", "queue:create-task:*", "queue:route:index.*"])
+    assert have.satisfies("scope1")
+    assert not have.satisfies("scope")
+    assert have.satisfies("queue:create-task:")
+    assert have.satisfies("queue:create-task:proj/abc")
+    assert not have.satisfies("queue:create-task")
+    assert have.satisfies_all(["scope1", "queue:route:index.x"])
+    assert not have.satisfies_all(["scope1", "queue:route:x"])
+    assert have.satisfies_all([])
+
+
+def reference_satisfies(have, require):
+    "The original nested-loop implementation of satisfies"
+    for req_scope in require:
+        for have_scope in have:
+            if have_scope == req_scope or (
+                have_scope.endswith("*") and req_scope.startswith(have_scope[:-1])
+            ):
+                break
+        else:
+            return False
+    return True
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_satisfies_matches_reference(seed):
+    rng = random.Random(seed)
+
+    def scope():
+        return "".join(rng.choice("ab:*") for _ in range(rng.randint(0, 4)))
+
+    have = [scope() for _ in range(rng.randint(0, 10))]
+    scopeset = ScopeSet(have)
+    for _ in range(20):
+        require = [scope() for _ in range(rng.randint(0, 3))]
+        expected = reference_satisfies(have, require)
+        assert satisfies(have, require) == expected
+        assert scopeset.satisfies_all(require) == expected
+
+
+@pytest.mark.slow
+def test_satisfies_benchmark():
+    have = ["queue:create-task:proj{}/*".format(i) for i in range(2000)] + [
+        "secrets:get:proj{}/token".format(i) for i in range(2000)
+    ]
+    require = ["queue:create-task:proj{}/x".format(i) for i in range(0, 2000, 2)] + [
+        "secrets:get:proj{}/token".format(i) for i in range(0, 2000, 2)
+    ]
+
+    start = time.monotonic()
+    assert reference_satisfies(have, require)
+    reference = time.monotonic() - start
+
+    start = time.monotonic()
+    scopeset = ScopeSet(have)
+    built = time.monotonic() - start
+    assert scopeset.satisfies_all(require)
+    queried = time.monotonic() - start - built
+
+    print(
+        "reference: {:.3f}s, ScopeSet: {:.3f}s to build, {:.3f}s to query".format(
+            reference, built, queried
+        )
+    )
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+import random
+import shutil
+import subprocess
+import time
+from tempfile import NamedTemporaryFile
+
+from tcadmin.util import unidiff
+from tcadmin.util.unidiff import unified_diff
+
+
+def gnu_diff(left, right, n, minimal):
+    "The subprocess implementation that unified_diff replaced"
+    with NamedTemporaryFile("w") as left_file, NamedTemporaryFile("w") as right_file:
+        left_file.write("\n".join(left))
+        left_file.flush()
+
+        right_file.write("\n".join(right))
+        right_file.flush()
+
+        args = ["diff", f"-U{n}", "--label", "current", "--label", "generated"]
+        if minimal:
+            args.append("--minimal")
+        args.extend([left_file.name, right_file.name])
+
+        return subprocess.run(args, encoding="utf8", stdout=subprocess.PIPE).stdout
+
+
+needs_diff = pytest.mark.skipif(shutil.which("diff") is None, reason="needs diff(1)")
+
+
+def test_unified_diff_identical():
+    assert unified_diff(["a", "b"], ["a", "b"]) == ""
+
+
+def test_unified_diff_hunks():
+    left = list("abcdefghijklmnop")
+    right = list("abcdXfghijklmnoZp")
+    assert unified_diff(left, right, 2, ("current", "generated")).split("\n") == [
+        "--- current",
+        "+++ generated",
+        "@@ -3,5 +3,5 @@",
+        " c",
+        " d",
+        "-e",
+        "+X",
+        " f",
+        " g",
+        "@@ -14,3 +14,4 @@",
+        " n",
+        " o",
+        "+Z",
+        " p",
+        "\\ No newline at end of file",
+        "",
+    ]
+
+
+def test_unified_diff_merges_close_hunks():
+    left = list("abcdefgh")
+    right = list("aXcdefgYh")
+    assert unified_diff(left, right, 3).split("\n")[2:4] == ["@@ -1,8 +1,9 @@", " a"]
+
+
+def test_unified_diff_empty():
+    assert unified_diff([], ["a"], 3).split("\n") == [
+        "--- a",
+        "+++ b",
+        "@@ -0,0 +1 @@",
+        "+a",
+        "\\ No newline at end of file",
+        "",
+    ]
+
+
+def test_unified_diff_missing_newline():
+    "a final empty line gives a trailing newline, distinct from an incomplete line"
+    assert unified_diff(["a", "b"], ["a", "b", ""], 3).split("\n")[2:] == [
+        "@@ -1,2 +1,2 @@",
+        " a",
+        "-b",
+        "\\ No newline at end of file",
+        "+b",
+        "",
+    ]
+
+
+@needs_diff
+@pytest.mark.parametrize("seed", range(200))
+def test_unified_diff_matches_gnu_diff(seed, monkeypatch):
+    monkeypatch.setattr(unidiff, "LARGE_DIFF_LINES", 10 ** 9)
+    rng = random.Random(seed)
+    alphabet = rng.choice(["ab", "abc", "abcdefgh", "abcdefghijklmnopqrstuvwxyz"])
+    left = [rng.choice(alphabet) for _ in range(rng.choice([0, 1, 5, 40, 300]))]
+    right = list(left)
+    for _ in range(rng.randint(0, 10)):
+        pos = rng.randint(0, len(right))
+        op = rng.random()
+        if op < 0.4:
+            right[pos:pos] = [rng.choice(alphabet) for _ in range(rng.randint(1, 5))]
+        elif op < 0.8:
+            del right[pos:pos + rng.randint(1, 5)]
+        else:
+            right[pos:pos + 1] = ["X"]
+    if rng.random() < 0.2:
+        left.append("")
+    if rng.random() < 0.2:
+        right.append("")
+    n = rng.choice([0, 1, 3, 8])
+    minimal = rng.random() < 0.5
+    assert unified_diff(
+        left, right, n, ("current", "generated"), minimal
+    ) == gnu_diff(left, right, n, minimal)
+
+
+@needs_diff
+@pytest.mark.parametrize("labels", [None, ("current", "generated")])
+def test_unified_diff_large_uses_diff(labels, monkeypatch):
+    "Large inputs are compared with diff(1), giving the same result"
+    rng = random.Random(1)
+    left = ["line {}".format(rng.randrange(100)) for _ in range(300)]
+    right = [l if rng.random() > 0.2 else "changed" for l in left]
+    monkeypatch.setattr(unidiff, "LARGE_DIFF_LINES", 10 ** 9)
+    expected = unified_diff(left, right, 3, labels)
+    calls = []
+    real_gnu_unified_diff = unidiff._gnu_unified_diff
+
+    def gnu_unified_diff(*args):
+        calls.append(args)
+        return real_gnu_unified_diff(*args)
+
+    monkeypatch.setattr(unidiff, "_gnu_unified_diff", gnu_unified_diff)
+    monkeypatch.setattr(unidiff, "LARGE_DIFF_LINES", 500)
+    assert unified_diff(left, right, 3, labels) == expected
+    assert len(calls) == 1
+    assert unified_diff(left[:100], right[:100], 3, labels) == unified_diff(
+        left[:100], right[:100], 3, labels
+    )
+    assert len(calls) == 1
+
+
+def test_unified_diff_large_without_diff(monkeypatch):
+    "Large inputs are compared in-process if diff(1) is not installed"
+    monkeypatch.setattr(unidiff, "LARGE_DIFF_LINES", 1)
+    monkeypatch.setattr(unidiff.shutil, "which", lambda cmd: None)
+    assert unified_diff(["a", "b", ""], ["a", "c", ""], 1, None) == (
+        "@@ -1,2 +1,2 @@\n a\n-b\n+c\n"
+    )
+
+
+@needs_diff
+@pytest.mark.slow
+@pytest.mark.parametrize("minimal", [False, True])
+@pytest.mark.parametrize("size", [200, 3000, 50000])
+def test_unified_diff_benchmark(size, minimal):
+    rng = random.Random(1)
+    left = ["line {}".format(rng.randrange(1000)) for _ in range(size)]
+    right = list(left)
+    for _ in range(20):
+        pos = rng.randrange(len(right))
+        right[pos:pos + 3] = ["changed {}".format(pos)]
+
+    def best_time(fn):
+        times = []
+        for _ in range(5):
+            start = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - start)
+        return result, min(times)
+
+    expected, subprocess_time = best_time(lambda: gnu_diff(left, right, 8, minimal))
+    result, in_process_time = best_time(
+        lambda: unified_diff(left, right, 8, ("current", "generated"), minimal)
+    )
+    assert result == expected
+    print(
+        "diff of {} lines: subprocess {:.4f}s, unified_diff {:.4f}s".format(
+            size, subprocess_time, in_process_time
+        )
+    )
@@ -135,7 +135,7 @@ class Updater:
                 g = generated_resources[id]
                 if id in current_resources:
                     c = current_resources[id]
-                    if c == g:
+                    if c.digest == g.digest:
                         continue  # no difference
                     await self.update_resource(ACTION_UPDATE, g)
                 else:
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+from collections import deque
+from sortedcontainers import SortedList
+
+from .scopes import Resolver, ScopeSet, _Trie
+
+
+class GrantIndex:
+    """
+    A reverse index over the roles and clients in a Resources instance,
+    answering the question "which roles and clients grant this scope, directly
+    or through `assume:` scopes?"
+
+    The index records the roles and clients holding each scope, and for each
+    role, the roles and clients holding a scope that matches it (the assume
+    graph, reversed).  A query looks up the principals granting the scope
+    directly, then follows the reversed graph from those that are roles, so it
+    visits only the principals involved rather than the whole deployment.
+    Parameters of parameterized roles are not tracked in the graph, so each
+    result is confirmed by expanding that principal's scopes.
+    """
+
+    def __init__(self, roles, clients):
+        "Instantiate given roles and clients, each of the form {id: [scopes]}"
+        self.roles = roles
+        self.clients = clients
+        self._resolver = Resolver(roles, cache_size=0)
+
+        # {scope: set of principals holding it}, with held star scopes also
+        # indexed by prefix
+        self._held = {}
+        self._held_stars = _Trie()
+        # parameterized scopes of star roles, `A<..>B`, indexed by `A`
+        self._templates = _Trie()
+        self._role_stars = _Trie()
+        self._role_ids = SortedList(roles)
+        # {roleId: {principal: scope held by that principal matching the role}}
+        self._assumed_by = {roleId: {} for roleId in roles}
+
+        for roleId in roles:
+            if roleId.endswith("*"):
+                self._role_stars.add(roleId[:-1], roleId)
+        # a role's own `assume:` scope may match other roles, too
+        for roleId in roles:
+            for matched, _ in self._resolver._matches("assume:" + roleId):
+                if matched != roleId:
+                    self._assumed_by[matched]["Role=" + roleId] = "assume:" + roleId
+        for roleId, scopes in roles.items():
+            for scope in scopes:
+                if roleId.endswith("*") and "<..>" in scope:
+                    self._add_template("Role=" + roleId, scope)
+                else:
+                    self._add_held("Role=" + roleId, scope)
+        for clientId, scopes in clients.items():
+            for scope in scopes:
+                self._add_held("Client=" + clientId, scope)
+
+    @classmethod
+    def from_resources(cls, resources):
+        """Construct an instance from a Resources instance, ignoring any
+        resources other than roles and clients"""
+        from ..resources import Role, Client
+
+        roles = {r.roleId: list(r.scopes) for r in resources.of_kind(Role)}
+        clients = {c.clientId: list(c.scopes) for c in resources.of_kind(Client)}
+        return cls(roles, clients)
+
+    def _add_held(self, principal, scope):
+        if scope not in self._held:
+            self._held[scope] = set()
+            if scope.endswith("*"):
+                self._held_stars.add(scope[:-1], scope)
+        self._held[scope].add(principal)
+        for roleId, _ in self._resolver._matches(scope):
+            self._assumed_by[roleId].setdefault(principal, scope)
+
+    def _add_template(self, principal, template):
+        before = template[:template.index("<..>")]
+        # with an empty parameter, `A*<..>` expands to the star scope `A*`,
+        # which grants scopes beginning with `A` alone
+        prefixes = [before]
+        if before.endswith("*"):
+            prefixes.append(before[:-1])
+        matched = set()
+        for prefix in prefixes:
+            self._templates.add(prefix, (principal, template))
+            # depending on the parameter, the expanded scope may match any role
+            # whose `assume:` scope begins with `prefix`, or any star role
+            # whose prefix `prefix` begins with
+            if prefix.startswith("assume:"):
+                for roleId in self._role_ids.irange(minimum=prefix[7:]):
+                    if not roleId.startswith(prefix[7:]):
+                        break
+                    matched.add(roleId)
+                matched.update(r for _, r in self._role_stars.prefixes_of(prefix[7:]))
+            elif "assume:".startswith(prefix):
+                matched.update(self._role_ids)
+        for roleId in matched:
+            self._assumed_by[roleId].setdefault(principal, template)
+
+    def who_grants(self, scope):
+        """
+        Return a list of (resourceId, chain) for each role and client that
+        grants the given scope, sorted by resourceId.  The chain is a list of
+        scopes through which the scope is granted, beginning with one held by
+        that role or client (or its own `assume:` scope, for a role) and ending
+        with one that satisfies the given scope.
+        """
+        chains = {}
+        pending = deque()
+
+        def found(principal, chain):
+            if principal not in chains:
+                chains[principal] = chain
+                if principal.startswith("Role="):
+                    pending.append(principal[5:])
+
+        # principals holding a scope that satisfies this one, or a
+        # parameterized scope that could expand to one
+        if scope in self._held:
+            for principal in sorted(self._held[scope]):
+                found(principal, (scope,))
+        for _, held in self._held_stars.prefixes_of(scope):
+            for principal in sorted(self._held[held]):
+                found(principal, (held,))
+        for _, (principal, template) in self._templates.prefixes_of(scope):
+            found(principal, (template,))
+
+        # principals that assume those roles, and so on
+        while pending:
+            roleId = pending.popleft()
+            for principal, held in sorted(self._assumed_by[roleId].items()):
+                found(principal, (held,) + chains["Role=" + roleId])
+
+        # roles whose own `assume:` scope satisfies this one (but whose
+        # assumers do not receive that scope)
+        if scope.startswith("assume:"):
+            if scope[7:] in self.roles:
+                chains.setdefault("Role=" + scope[7:], (scope,))
+            for _, roleId in self._role_stars.prefixes_of(scope[7:]):
+                chains.setdefault("Role=" + roleId, ("assume:" + roleId,))
+
+        # confirm each result by expanding the principal's scopes
+        results = []
+        for principal, chain in sorted(chains.items()):
+            if principal.startswith("Role="):
+                scopes = ["assume:" + principal[5:]]
+            else:
+                scopes = self.clients[principal[7:]]
+            if ScopeSet(self._resolver.expandScopes(scopes)).satisfies(scope):
+                results.append((principal, list(chain)))
+        return results
@@ -6,29 +6,151 @@
 
 import re
 import attr
+from collections import OrderedDict
+
+
+# characters with a special meaning in regular expressions
+SPECIAL_CHARACTERS = frozenset(".^$*+?{}[]\\|()")
+
+# number of recent `MatchList.matches` results to remember
+MEMO_SIZE = 4096
+
+# backreferences and conditionals refer to groups by number or name, and so
+# cannot be combined into a single expression
+BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
 
 
 def make_regular_expressions(patterns):
     return [re.compile(p) for p in patterns]
 
 
+def literal_prefix(pattern):
+    """
+    Return a literal string with which everything matched by `pattern` (rooted
+    at the left, as for `re.match`) must begin.  This is conservative: it stops
+    at the first construct it does not understand, and is empty for patterns
+    containing alternation.  A leading `^` is redundant in a rooted pattern
+    and is skipped.
+    """
+    if "|" in pattern:
+        return ""
+    prefix = []
+    i = 1 if pattern.startswith("^") else 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            # escaped punctuation is literal; `\d`, `\A` and the like are not
+            if i + 1 == len(pattern) or pattern[i + 1].isalnum():
+                break
+            c = pattern[i + 1]
+            i += 2
+        elif c in SPECIAL_CHARACTERS:
+            break
+        else:
+            i += 1
+        # a quantifier may make this character optional
+        if pattern[i:i + 1] in ("*", "?", "{"):
+            break
+        prefix.append(c)
+        if pattern[i:i + 1] == "+":
+            break
+    return "".join(prefix)
+
+
 @attr.s
 class MatchList:
     """
     A MatchList is a list of regular expressions that can determine whether a
     given string matches one of those patterns.  Patterns are rooted at the
     left, but should use `$` where required to match the end of the string.
+
+    The patterns are compiled into a single alternation, and the results of
+    recent calls to `matches` are remembered, as the same ids tend to be
+    checked repeatedly.
     """
 
     _patterns = attr.ib(type=list, converter=make_regular_expressions)
 
+    def __attrs_post_init__(self):
+        self._compile()
+
+    def _compile(self):
+        self._memo = OrderedDict()
+        self._combined = None
+        if any(BACKREFERENCE.search(p.pattern) for p in self._patterns):
+            return
+        # a pattern with global inline flags, such as `(?i)`, cannot be
+        # combined: depending on the Python version, this is either an error or
+        # applies the flags to every pattern in the combined expression
+        if any(p.flags & ~re.UNICODE for p in self._patterns):
+            return
+        try:
+            self._combined = re.compile(
+                "|".join("(?:{})".format(p.pattern) for p in self._patterns)
+                or "(?!)"
+            )
+        except re.error:
+            # fall back to matching the patterns one at a time
+            pass
+
     def add(self, expr):
         "Add `expr` to the set of patterns"
         self._patterns.append(re.compile(expr))
+        self._compile()
 
     def __iter__(self):
         return (p.pattern for p in self._patterns)
 
+    def could_match(self, prefix):
+        """
+        Return True if some string beginning with `prefix` might be matched by
+        one of the patterns in the list.  This is conservative: it may return
+        True when no such string is actually matched, but never False when one
+        is.
+        """
+        for pat in self._patterns:
+            pattern_prefix = literal_prefix(pat.pattern)
+            if pattern_prefix.startswith(prefix) or prefix.startswith(pattern_prefix):
+                return True
+        return False
+
+    def prefixes(self, kind_prefix):
+        """
+        Return a minimal list of literal prefixes such that every string
+        beginning with `kind_prefix` that is matched by one of the patterns
+        begins with `kind_prefix` followed by one of the returned prefixes.
+        The prefixes are returned without `kind_prefix`, and none is a prefix
+        of another, so `[""]` indicates that nothing can be narrowed and `[]`
+        that nothing can match.
+        """
+        candidates = set()
+        for pat in self._patterns:
+            pattern_prefix = literal_prefix(pat.pattern)
+            if pattern_prefix.startswith(kind_prefix):
+                candidates.add(pattern_prefix[len(kind_prefix):])
+            elif kind_prefix.startswith(pattern_prefix):
+                candidates.add("")
+        prefixes = []
+        for candidate in sorted(candidates):
+            # in sorted order, any prefix of `candidate` sorts just before it
+            if prefixes and candidate.startswith(prefixes[-1]):
+                continue
+            prefixes.append(candidate)
+        return prefixes
+
     def matches(self, item):
         "Return True if this item is matched by one of the patterns in the list"
-        return any(pat.match(item) for pat in self._patterns)
+        memo = self._memo
+        try:
+            memo.move_to_end(item)
+            return memo[item]
+        except KeyError:
+            pass
+        if self._combined is not None:
+            result = self._combined.match(item) is not None
+        else:
+            result = any(pat.match(item) for pat in self._patterns)
+        memo[item] = result
+        if len(memo) > MEMO_SIZE:
+            memo.popitem(last=False)
+        return result
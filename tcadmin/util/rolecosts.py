@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+import attr
+
+from .scopes import Resolver
+
+
+@attr.s(slots=True, frozen=True)
+class RoleCost:
+    """
+    The cost of expanding a role: the number of roles in its strongly connected
+    component of the role graph (more than one for roles in a cycle), the
+    length of the longest chain of roles it grants (counting each cycle once),
+    the number of other roles it grants directly, and the number of scopes in
+    its expansion.
+    """
+
+    roleId = attr.ib(type=str)
+    component = attr.ib(type=int)
+    depth = attr.ib(type=int)
+    fan_out = attr.ib(type=int)
+    closure = attr.ib(type=int)
+
+
+def _components(nodes, successors):
+    """
+    Return the strongly connected components of the graph with the given nodes
+    and {node: successors}, as lists of nodes, successors before predecessors.
+    This is Tarjan's algorithm, run iteratively.
+    """
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root in nodes:
+        if root in index:
+            continue
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        calls = [(root, iter(successors[root]))]
+        while calls:
+            v, it = calls[-1]
+            for w in it:
+                if w not in index:
+                    index[w] = low[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    calls.append((w, iter(successors[w])))
+                    break
+                if w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                calls.pop()
+                if calls:
+                    parent = calls[-1][0]
+                    low[parent] = min(low[parent], low[v])
+                if low[v] != index[v]:
+                    continue
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    component.append(w)
+                    if w == v:
+                        break
+                components.append(component)
+    return components
+
+
+def analyze_roles(roles):
+    """
+    Given roles of the form {roleId: [scopes]}, return {roleId: RoleCost}.
+
+    The role graph has an edge from each role to every role matched by a scope
+    in the direct expansion of assuming it, so roles granted only through a
+    parameter of a parameterized role are not counted in fan-out or depth.
+    Closure sizes, however, are exact.
+    """
+    resolver = Resolver(roles, cache_size=0)
+    successors = {}
+    for roleId in sorted(roles):
+        granted = set()
+        for scope in resolver._expand_scope("assume:" + roleId):
+            granted.update(r for r, _ in resolver._matches(scope))
+        successors[roleId] = granted
+
+    costs = {}
+    depths = {}
+    for component in _components(sorted(roles), successors):
+        members = set(component)
+        depth = 0
+        for roleId in component:
+            for r in successors[roleId] - members:
+                depth = max(depth, depths[r] + 1)
+        for roleId in component:
+            depths[roleId] = depth
+            costs[roleId] = RoleCost(
+                roleId=roleId,
+                component=len(component),
+                depth=depth,
+                fan_out=len(successors[roleId] - {roleId}),
+                closure=len(resolver.expandScopes(["assume:" + roleId])),
+            )
+    return costs
+
+
+def total_closure(costs):
+    "Return the total closure size of the roles in {roleId: RoleCost}"
+    return sum(cost.closure for cost in costs.values())
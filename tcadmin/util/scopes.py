@@ -5,93 +5,537 @@
 # obtain one at http://mozilla.org/MPL/2.0/.
 
 import re
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from sortedcontainers import SortedList
+
+# `<..>` in a role's scopes is replaced by the parameter; if the parameter ends
+# with `*`, that consumes everything after the `<..>` as well
+PARAMETER = re.compile(r"<\.\.>")
+PARAMETER_STAR = re.compile(r"<\.\.>.*")
+
+# the Auth service's limit on rounds of expansion, each of which follows one
+# more step of `assume:` scopes
+MAX_EXPANSION_ROUNDS = 100
+
+# maximum length of an assume: chain followed when computing a closure, as a
+# guard against runaway graphs; `MAX_EXPANSION_ROUNDS` is enforced separately
+MAX_CLOSURE_DEPTH = 10000
+
+
+def _substitute(role_scopes, param):
+    "Substitute `param` for `<..>` in the given role scopes"
+    pat = PARAMETER_STAR if param.endswith("*") else PARAMETER
+    return {pat.sub(param, rs) for rs in role_scopes}
+
+
+class _Trie:
+    """
+    A character trie mapping strings to sets of values, able to find all values
+    stored under any prefix of a given string.
+    """
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, key, value):
+        node = self.root
+        for c in key:
+            node = node.setdefault(c, {})
+        node.setdefault(None, set()).add(value)
+
+    def remove(self, key, value):
+        path = [self.root]
+        for c in key:
+            path.append(path[-1][c])
+        path[-1][None].discard(value)
+        if not path[-1][None]:
+            del path[-1][None]
+        # prune nodes that no longer lead to any values
+        for i in range(len(key), 0, -1):
+            if path[i]:
+                break
+            del path[i - 1][key[i - 1]]
+
+    def prefixes_of(self, string):
+        "Yield (prefix, value) for every stored key that is a prefix of `string`"
+        node = self.root
+        for i in range(len(string) + 1):
+            for value in node.get(None, ()):
+                yield string[:i], value
+            if i == len(string):
+                break
+            node = node.get(string[i])
+            if node is None:
+                break
+
+    def has_prefix_of(self, string):
+        "Return True if some stored key is a prefix of `string`"
+        node = self.root
+        for c in string:
+            if None in node:
+                return True
+            node = node.get(c)
+            if node is None:
+                return False
+        return None in node
 
 
 class Resolver:
     """
     A scope expander, to emulate the expansion performed by the Taskcluster
     Auth service.
+
+    Roles are indexed by their exact `assume:` scope, by prefix (for star
+    roles, whose ids end in `*`), and in sorted order (to find all roles
+    matched by a scope ending in `*`), so that expanding a scope takes time
+    proportional to the scope's length and the number of matching roles.
+
+    If `cache_size` is given, the resolver instead remembers the transitive
+    closure of every scope it expands, computing closures for each strongly
+    connected component of the assume graph at once, and keeps the results of
+    the most recent `cache_size` calls to `expandScopes`.  It also records an
+    upper bound on the number of rounds of expansion each closure requires, and
+    only where that reaches the Auth service's limit are the rounds counted.
+
+    Roles can be changed with `add_role`, `update_role` and `remove_role`, in
+    which case only the cached results that depend on the changed role are
+    discarded.
     """
 
-    def __init__(self, roles):
+    def __init__(self, roles, cache_size=None):
         "Instantiate given roles of the form {roleId: [scopes]}"
-        self.roles = roles
+        self.roles = dict(roles)
+        self.cache_size = cache_size
+        self._star_roles = _Trie()
+        self._role_ids = SortedList()
+        for roleId in roles:
+            self._index_role(roleId)
+        # {scope: frozenset(closure)}, for scopes that grant other scopes, and
+        # {scope: bound on the rounds needed to expand it} for the same scopes
+        self._closures = {}
+        self._depths = {}
+        # {frozenset(scopes): expanded}, for recent calls to expandScopes
+        self._expansions = OrderedDict()
+        # {scope: set of scopes that directly grant it}, and all scopes in that
+        # graph in sorted order, for every scope whose closure was computed
+        self._granted_by = {}
+        self._known_scopes = SortedList()
 
     @classmethod
-    def from_resources(cls, resources):
+    def from_resources(cls, resources, **kwargs):
         """Construct an instance from a Resources instance, ignoring any non-Role
         resources"""
         from ..resources import Role
 
         roles = {}
-        for resource in resources:
-            if isinstance(resource, Role):
-                roles[resource.roleId] = resource.scopes[:]
-        return cls(roles)
-
-    def _star_match(self, star_match, role_scopes):
-        if star_match.endswith("*"):
-            pat = re.compile(
-                r"<\.\.>.*"
-            )  # * in star_match consumes everything after <...>
+        for resource in resources.of_kind(Role):
+            roles[resource.roleId] = resource.scopes[:]
+        return cls(roles, **kwargs)
+
+    def _index_role(self, roleId):
+        self._role_ids.add(roleId)
+        if roleId.endswith("*"):
+            self._star_roles.add(roleId[:-1], roleId)
+
+    def _unindex_role(self, roleId):
+        self._role_ids.remove(roleId)
+        if roleId.endswith("*"):
+            self._star_roles.remove(roleId[:-1], roleId)
+
+    def add_role(self, roleId, scopes):
+        """
+        Add a new role.  Like `update_role` and `remove_role`, this returns the
+        set of previously-expanded scopes whose expansion may have changed.
+        """
+        if roleId in self.roles:
+            raise RuntimeError("role {} already exists".format(roleId))
+        stale = self._invalidate(roleId)
+        self.roles[roleId] = scopes
+        self._index_role(roleId)
+        return stale
+
+    def update_role(self, roleId, scopes):
+        "Change the scopes of an existing role"
+        if roleId not in self.roles:
+            raise KeyError(roleId)
+        stale = self._invalidate(roleId)
+        self.roles[roleId] = scopes
+        return stale
+
+    def remove_role(self, roleId):
+        "Remove an existing role"
+        if roleId not in self.roles:
+            raise KeyError(roleId)
+        stale = self._invalidate(roleId)
+        del self.roles[roleId]
+        self._unindex_role(roleId)
+        return stale
+
+    def _invalidate(self, roleId):
+        """
+        Discard cached closures and expansions that depend on the given role:
+        those of scopes that grant the role directly, and of every scope that
+        grants one of those, through the assume graph.  Return the set of all
+        such scopes.
+        """
+        granted_by = self._granted_by
+        known = self._known_scopes
+        assume = "assume:" + roleId
+
+        # scopes that match this role (see `_matches`)
+        stale = set()
+        if assume in granted_by:
+            stale.add(assume)
+        if roleId.endswith("*"):
+            for scope in known.irange(minimum=assume[:-1]):
+                if not scope.startswith(assume[:-1]):
+                    break
+                stale.add(scope)
+        for i in range(len(assume) + 1):
+            if assume[:i] + "*" in granted_by:
+                stale.add(assume[:i] + "*")
+
+        pending = list(stale)
+        while pending:
+            scope = pending.pop()
+            self._closures.pop(scope, None)
+            self._depths.pop(scope, None)
+            for granting in granted_by.get(scope, ()):
+                if granting not in stale:
+                    stale.add(granting)
+                    pending.append(granting)
+
+        for key in list(self._expansions):
+            if not key.isdisjoint(stale):
+                del self._expansions[key]
+        return stale
+
+    def _matches(self, scope):
+        """
+        Yield (roleId, param) for each role granted by `scope`, where param is
+        the parameter to substitute for `<..>` in the role's scopes, or None if
+        the role's scopes are granted verbatim.  A role may be yielded more
+        than once.
+        """
+        if scope.startswith("assume:"):
+            rest = scope[7:]
+            # exact match
+            if rest in self.roles:
+                yield rest, None
+            # star roles with ids matching the scope
+            for prefix, roleId in self._star_roles.prefixes_of(rest):
+                yield roleId, rest[len(prefix):]
+        if scope.endswith("*"):
+            pfx = scope[:-1]
+            if pfx.startswith("assume:"):
+                matched = self._role_ids.irange(minimum=pfx[7:])
+                pfx = pfx[7:]
+            elif "assume:".startswith(pfx):
+                matched = self._role_ids
+                pfx = ""
+            else:
+                return
+            for roleId in matched:
+                if not roleId.startswith(pfx):
+                    break
+                yield roleId, "*" if roleId.endswith("*") else None
+
+    def _expand_scope(self, scope):
+        "Return the set of scopes directly granted by `scope`"
+        expanded = set()
+        for roleId, param in self._matches(scope):
+            if param is None:
+                expanded.update(self.roles[roleId])
+            else:
+                expanded.update(_substitute(self.roles[roleId], param))
+        return expanded
+
+    def _closure(self, scope):
+        """
+        Return the set of all scopes granted, directly or indirectly, by
+        `scope`, including `scope` itself.
+
+        This is Tarjan's algorithm, run iteratively: every scope in a strongly
+        connected component has the same closure, and components are completed
+        in reverse topological order, so each closure is built from the
+        already-complete closures of its successors.
+
+        The bound on the rounds of expansion needed for a component is the
+        longest path through its successors' components, plus the number of
+        steps a path can take within the component itself.
+        """
+        closures = self._closures
+        depths = self._depths
+        if scope in closures:
+            return closures[scope]
+
+        index = {}
+        low = {}
+        successors = {}
+        stack = []
+        on_stack = set()
+        done = {}
+        done_depths = {}
+
+        granted_by = self._granted_by
+        known = self._known_scopes
+
+        def visit(v):
+            index[v] = low[v] = len(index)
+            successors[v] = self._expand_scope(v)
+            # record the edges of the assume graph, for `_invalidate`
+            for w in (v, *successors[v]):
+                if w not in granted_by:
+                    granted_by[w] = set()
+                    known.add(w)
+            for w in successors[v]:
+                granted_by[w].add(v)
+            stack.append(v)
+            on_stack.add(v)
+            calls.append((v, iter(successors[v])))
+            if len(calls) > MAX_CLOSURE_DEPTH:
+                raise RuntimeError("maxium role expansion depth reached")
+
+        calls = []
+        visit(scope)
+        while calls:
+            v, it = calls[-1]
+            for w in it:
+                if w in closures or w in done:
+                    continue
+                if w not in index:
+                    visit(w)
+                    break
+                if w in on_stack:
+                    low[v] = min(low[v], index[w])
+            else:
+                calls.pop()
+                if calls:
+                    parent = calls[-1][0]
+                    low[parent] = min(low[parent], low[v])
+                if low[v] != index[v]:
+                    continue
+                # v is the root of a strongly connected component
+                component = []
+                while True:
+                    w = stack.pop()
+                    on_stack.discard(w)
+                    component.append(w)
+                    if w == v:
+                        break
+                members = set(component)
+                closure = set(component)
+                depth = 0
+                for w in component:
+                    for x in successors[w]:
+                        if x not in members:
+                            if x in closures:
+                                closure.update(closures[x])
+                                depth = max(depth, depths[x] + 1)
+                            else:
+                                closure.update(done[x])
+                                depth = max(depth, done_depths[x] + 1)
+                depth += len(component) - 1
+                closure = frozenset(closure)
+                for w in component:
+                    done[w] = closure
+                    done_depths[w] = depth
+                    # only remember closures of scopes that expand to something
+                    if len(closure) > 1:
+                        closures[w] = closure
+                        depths[w] = depth
+        return done[scope]
+
+    def expand_many(self, scope_lists, processes=None):
+        """
+        Expand each of the given lists of scopes, returning a list of results
+        in the same order.  If `processes` is greater than one, the work is
+        spread over that many worker processes: data from which to expand
+        scopes is sent to each worker once, and the scope lists in chunks.
+        With `cache_size`, that data is the table of closures, computed here,
+        once, so that the workers need only combine and normalize them;
+        otherwise it is the roles.
+        """
+        scope_lists = [list(scopes) for scopes in scope_lists]
+        if not processes or processes == 1:
+            return [self.expandScopes(scopes) for scopes in scope_lists]
+
+        if self.cache_size is None:
+            initializer, initargs = _init_worker, (self.roles,)
         else:
-            pat = re.compile(r"<\.\.>")
-        scopes = set()
-        for rs in role_scopes:
-            scopes.add(pat.sub(star_match, rs))
-        return scopes
+            for scopes in scope_lists:
+                for scope in scopes:
+                    self._closure(scope)
+                self._check_rounds(scopes)
+            initializer, initargs = _init_closures_worker, (self._closures,)
+
+        # a few chunks per process evens out the differences between chunks
+        chunksize = max(1, -(-len(scope_lists) // (processes * 4)))
+        chunks = (
+            scope_lists[i:i + chunksize] for i in range(0, len(scope_lists), chunksize)
+        )
+        expanded = []
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=initializer, initargs=initargs
+        ) as executor:
+            for results in executor.map(_expand_chunk, chunks):
+                expanded.extend(results)
+        return expanded
+
+    def precompute(self):
+        """
+        Compute the closure of every role without a parameter (that is, whose
+        roleId does not end in `*`), so that later expansions need only combine
+        them.  This is only useful with `cache_size`.
+        """
+        for roleId in self.roles:
+            if not roleId.endswith("*"):
+                self._closure("assume:" + roleId)
 
     def expandScopes(self, scopes):
         """
         Given a set of scopes, expand them, following the same rules that the
-        taskcluster-auth service does.  But not the same algorithm -- this is
-        potentially *very* slow.
+        taskcluster-auth service does.
         """
         assert isinstance(scopes, list)
-        scopes = {s: set() for s in scopes}
-        expanded = set()
+        if self.cache_size is None:
+            return self._expand_rounds(scopes)
 
-        def add_scope(scope, for_role):
-            scopes.setdefault(scope, set()).add(for_role)
+        key = frozenset(scopes)
+        expansions = self._expansions
+        try:
+            expansions.move_to_end(key)
+            return list(expansions[key])
+        except KeyError:
+            pass
+        seen = set()
+        for scope in key:
+            seen.update(self._closure(scope))
+        self._check_rounds(key)
+        expanded = normalizeScopes(seen)
+        expansions[key] = tuple(expanded)
+        if len(expansions) > self.cache_size:
+            expansions.popitem(last=False)
+        return expanded
 
-        for _ in range(100):
-            prev = scopes.copy()
+    def _check_rounds(self, scopes):
+        """
+        Raise the Auth service's error if expanding `scopes`, whose closures
+        have been computed, would take more rounds than it allows.  The rounds
+        are only counted if the recorded bound reaches the limit.
+        """
+        depths = self._depths
+        if any(depths.get(scope, 0) >= MAX_EXPANSION_ROUNDS for scope in scopes):
+            self._expand_rounds(scopes)
 
-            for scope, already_expanded in prev.items():
-                if scope in expanded:
-                    continue
-                expanded.add(scope)
-
-                for role, role_scopes in self.roles.items():
-                    assume = "assume:{}".format(role)
-                    if role.endswith("*"):
-                        pfx = assume[:-1]
-                        if scope.startswith(pfx):
-                            for s in self._star_match(scope[len(pfx):], role_scopes):
-                                add_scope(s, role)
-                                scopes[s].update(already_expanded)
-                    if scope.endswith("*"):
-                        pfx = scope[:-1]
-                        if assume.startswith(pfx):
-                            if assume.endswith("*"):
-                                for s in self._star_match("*", role_scopes):
-                                    add_scope(s, role)
-                                    scopes[s].update(already_expanded)
-                            else:
-                                for s in role_scopes:
-                                    add_scope(s, role)
-                                    scopes[s].update(already_expanded)
-                    if scope == assume:
-                        for s in role_scopes:
-                            add_scope(s, role)
-                            scopes[s].update(already_expanded)
-
-            if scopes == prev:
+    def _expand_rounds(self, scopes):
+        "Expand scopes in rounds, breadth-first, as the Auth service does"
+        seen = set(scopes)
+        frontier = list(seen)
+        for _ in range(MAX_EXPANSION_ROUNDS):
+            discovered = []
+            for scope in frontier:
+                for s in self._expand_scope(scope):
+                    if s not in seen:
+                        seen.add(s)
+                        discovered.append(s)
+            if not discovered:
                 break
+            frontier = discovered
         else:
             raise RuntimeError("maxium role expansion depth reached")
 
-        return normalizeScopes(scopes)
+        return normalizeScopes(seen)
+
+
+# the resolver used by each worker process in `Resolver.expand_many`
+_worker_resolver = None
+
+
+def _init_worker(roles):
+    global _worker_resolver
+    _worker_resolver = Resolver(roles)
+
+
+def _init_closures_worker(closures):
+    global _worker_resolver
+    _worker_resolver = _ClosureExpander(closures)
+
+
+def _expand_chunk(scope_lists):
+    return [_worker_resolver.expandScopes(scopes) for scopes in scope_lists]
+
+
+class _ClosureExpander:
+    "Expands scopes given the closures of every scope involved, as computed by Resolver"
+
+    def __init__(self, closures):
+        self._closures = closures
+
+    def expandScopes(self, scopes):
+        closures = self._closures
+        seen = set()
+        for scope in scopes:
+            closure = closures.get(scope)
+            if closure is None:
+                seen.add(scope)
+            else:
+                seen.update(closure)
+        return normalizeScopes(seen)
+
+
+def expand_all(resources, resolver=None, processes=None):
+    """
+    Return {resourceId: expanded scopes} for every Role and Client in the
+    given Resources instance.  A role's expansion is that of assuming it.
+
+    All expansions share one caching resolver, so sub-closures common to
+    several principals are computed only once.  A resolver may be supplied;
+    by default one is built from `resources`.  With `processes`, the
+    expansions are divided among that many worker processes, as described for
+    `Resolver.expand_many`.
+    """
+    from ..resources import Role, Client
+
+    if resolver is None:
+        resolver = Resolver.from_resources(resources, cache_size=0)
+    principals = [
+        (role.id, ["assume:" + role.roleId]) for role in resources.of_kind(Role)
+    ]
+    principals.extend(
+        (client.id, list(client.scopes)) for client in resources.of_kind(Client)
+    )
+    expanded = resolver.expand_many(
+        [scopes for _, scopes in principals], processes=processes
+    )
+    return {id: scopes for (id, _), scopes in zip(principals, expanded)}
+
+
+class ScopeSet:
+    """
+    A set of scopes, built once, that can efficiently answer whether it
+    satisfies other scopes.  Exact scopes are kept in a set and star scopes in
+    a trie, so each query takes time proportional to the length of the
+    required scope.
+    """
+
+    def __init__(self, scopes):
+        self._exact = set(scopes)
+        self._stars = _Trie()
+        for scope in self._exact:
+            if scope.endswith("*"):
+                self._stars.add(scope[:-1], scope)
+
+    def satisfies(self, scope):
+        "Return True if this set satisfies `scope`"
+        return scope in self._exact or self._stars.has_prefix_of(scope)
+
+    def satisfies_all(self, require):
+        "Return True if this set satisfies every scope in `require`"
+        exact = self._exact
+        has_prefix_of = self._stars.has_prefix_of
+        return all(scope in exact or has_prefix_of(scope) for scope in require)
 
 
 def satisfies(have, require):
@@ -99,28 +543,33 @@ def satisfies(have, require):
     """
     assert isinstance(have, list)
     assert isinstance(require, list)
-    for req_scope in require:
-        for have_scope in have:
-            if have_scope == req_scope or (
-                have_scope.endswith("*") and req_scope.startswith(have_scope[:-1])
-            ):
-                break
-        else:
-            return False
-    return True
+    return ScopeSet(have).satisfies_all(require)
 
 
 def normalizeScopes(scopes):
     """Return a "normalized" version of the given scopes, such that no scope
     satisfies any other.  """
-    # this is O(n^2) but we don't manage 1000's of scopes, so it's OK for now
     scopes = set(scopes)  # remove duplicates
-    scopes = sorted(
-        p1
-        for p1 in scopes
-        if all(
-            p1 == p2 or not (p2.endswith("*") and p1.startswith(p2[:-1]))
-            for p2 in scopes
-        )
-    )
-    return scopes
+
+    # Sort each scope by the prefix it covers (the scope itself, or the scope
+    # without its trailing `*`), with star scopes first among equals.  All
+    # scopes covered by a star scope then immediately follow it, and a single
+    # sweep tracking the outermost star scope seen so far finds them.
+    def key(scope):
+        if scope.endswith("*"):
+            return scope[:-1], 0
+        return scope, 1
+
+    normalized = []
+    cover = None
+    for prefix, star in sorted(key(scope) for scope in scopes):
+        if cover is not None and prefix.startswith(cover):
+            continue
+        if star == 0:
+            cover = prefix
+        scope = prefix + "*" if star == 0 else prefix
+        # `X*` is also satisfied by `X**`, which does not sort before it
+        if star == 0 and scope + "*" in scopes:
+            continue
+        normalized.append(scope)
+    return sorted(normalized)
@@ -0,0 +1,637 @@
+# -*- coding: utf-8 -*-
+
+# This Source Code Form is subject to the terms of the Mozilla Public License,
+# v. 2.0. If a copy of the MPL was not distributed with this file, You can
+# obtain one at http://mozilla.org/MPL/2.0/.
+
+"""
+An in-process implementation of `diff -U<n>`, producing the same output as GNU
+diff.  It follows GNU diff's algorithm: trim the identical beginning and end of
+the files, discard lines that cannot match ("confusing lines"), find the
+changes with Myers' O(ND) algorithm (giving up on a minimal result when that
+becomes too expensive, unless `minimal`), and finally slide each run of changes
+to a canonical position.
+
+This is quicker than running `diff` for small inputs, such as a single
+resource, but much slower for large inputs with many changes, so inputs of more
+than `LARGE_DIFF_LINES` lines are passed to `diff` if it is installed.
+"""
+
+import shutil
+import subprocess
+from bisect import bisect_left
+from collections import Counter
+from itertools import compress
+from tempfile import NamedTemporaryFile
+
+NO_NEWLINE = "\\ No newline at end of file"
+
+# inputs with more lines than this, in total, are compared with diff(1)
+LARGE_DIFF_LINES = 400
+
+
+class _File:
+    "The lines of a file, as they would be written by '\\n'.join(lines)"
+
+    def __init__(self, lines):
+        text = "\n".join(lines)
+        self.lines = text.split("\n") if text else []
+        self.missing_newline = bool(self.lines) and self.lines[-1] != ""
+        if self.lines and not self.missing_newline:
+            self.lines.pop()
+        # an incomplete last line never matches a complete one
+        self.keys = list(self.lines)
+        if self.missing_newline:
+            self.keys[-1] = "\n" + self.keys[-1]
+
+    def size(self, lines):
+        "the size in bytes of the given lines, counting newlines"
+        return sum(map(len, lines)) + len(lines)
+
+
+def _identical_ends(a, b, horizon):
+    """
+    Return the number of lines at the beginning and end of both files that can
+    be left out of the comparison, as GNU diff does: the identical prefix and
+    suffix, less `horizon` lines of each.  The suffix may not overlap the
+    prefix in the shorter file.
+    """
+    prefix = _snake(a.keys, b.keys, 0, 0, len(a.keys), len(b.keys))
+    prefix = max(0, prefix - horizon)
+
+    suffix = 0
+    if a.missing_newline == b.missing_newline:
+        suffix = _snake_back(
+            a.keys, b.keys, len(a.keys), len(b.keys), prefix, prefix
+        )
+        limit = min(a.size(a.lines), b.size(b.lines)) - a.size(a.lines[:prefix])
+        size = a.size(a.lines[len(a.lines) - suffix:])
+        while size > limit:
+            suffix -= 1
+            size -= len(a.lines[len(a.lines) - suffix - 1]) + 1
+    suffix = max(0, suffix - horizon)
+    return prefix, suffix
+
+
+def _discard_confusing_lines(equivs, counts):
+    """
+    Return, for each line of one file, 0 if it should be compared, or 1 if it
+    can be discarded before comparison as it matches no line in the other file
+    (or matches so many lines, among other discardable lines, that it is
+    unlikely to be useful).  `counts` gives the number of lines in the other
+    file in each equivalence class.
+    """
+    end = len(equivs)
+    many = 5
+    tem = end // 64
+    while True:
+        tem >>= 2
+        if tem <= 0:
+            break
+        many *= 2
+
+    discards = [
+        1 if nmatch == 0 else 2 if nmatch > many else 0
+        for nmatch in map(counts.__getitem__, equivs)
+    ]
+
+    # provisional discards (2) stand only within a run of discards with
+    # nonprovisional discards at either end
+    # lines not to be discarded are skipped, as they are never changed here
+    skip_to = 0
+    for i in compress(range(end), discards[:]):
+        if i < skip_to:
+            continue
+        if discards[i] == 2:
+            discards[i] = 0
+        elif discards[i] != 0:
+            provisional = 0
+            j = i
+            while j < end and discards[j] != 0:
+                if discards[j] == 2:
+                    provisional += 1
+                j += 1
+            while j > i and discards[j - 1] == 2:
+                j -= 1
+                discards[j] = 0
+                provisional -= 1
+            length = j - i
+
+            if provisional * 4 > length:
+                while j > i:
+                    j -= 1
+                    if discards[j] == 2:
+                        discards[j] = 0
+            else:
+                minimum = 1
+                tem = length >> 2
+                while True:
+                    tem >>= 2
+                    if tem <= 0:
+                        break
+                    minimum <<= 1
+                minimum += 1
+
+                # cancel any subrun of `minimum` or more provisionals
+                j = consec = 0
+                while j < length:
+                    if discards[i + j] != 2:
+                        consec = 0
+                    else:
+                        consec += 1
+                        if minimum == consec:
+                            j -= consec
+                        elif minimum < consec:
+                            discards[i + j] = 0
+                    j += 1
+
+                # cancel provisionals at the beginning of the run, until three
+                # nonprovisionals in a row or one at least eight lines in
+                j = consec = 0
+                while j < length:
+                    if j >= 8 and discards[i + j] == 1:
+                        break
+                    if discards[i + j] == 2:
+                        consec = 0
+                        discards[i + j] = 0
+                    elif discards[i + j] == 0:
+                        consec = 0
+                    else:
+                        consec += 1
+                    if consec == 3:
+                        break
+                    j += 1
+
+                i += length - 1
+
+                # and likewise at the end
+                j = consec = 0
+                while j < length:
+                    if j >= 8 and discards[i - j] == 1:
+                        break
+                    if discards[i - j] == 2:
+                        consec = 0
+                        discards[i - j] = 0
+                    elif discards[i - j] == 0:
+                        consec = 0
+                    else:
+                        consec += 1
+                    if consec == 3:
+                        break
+                    j += 1
+        skip_to = i + 1
+    return discards
+
+
+def _snake(xv, yv, x, y, xlim, ylim):
+    """
+    Return the number of equal elements of xv and yv, starting at x and y,
+    before xlim or ylim.  Long snakes are compared a slice at a time.
+    """
+    n = 0
+    step = 1
+    limit = min(xlim - x, ylim - y)
+    while n < limit:
+        step = min(step, limit - n)
+        if xv[x + n:x + n + step] == yv[y + n:y + n + step]:
+            n += step
+            step *= 2
+        elif step == 1:
+            break
+        else:
+            step = 1
+    return n
+
+
+def _snake_back(xv, yv, x, y, xoff, yoff):
+    """
+    Return the number of equal elements of xv and yv, ending just before x and
+    y, after xoff or yoff.
+    """
+    n = 0
+    step = 1
+    limit = min(x - xoff, y - yoff)
+    while n < limit:
+        step = min(step, limit - n)
+        if xv[x - n - step:x - n] == yv[y - n - step:y - n]:
+            n += step
+            step *= 2
+        elif step == 1:
+            break
+        else:
+            step = 1
+    return n
+
+
+def _compareseq(xv, yv, minimal, too_expensive):
+    """
+    Compare sequences xv and yv, returning the sets of indexes of their
+    elements that are deleted from xv and inserted into yv.  This is Myers'
+    divide-and-conquer algorithm, finding the middle snake of the shortest edit
+    script by searching from both ends at once.
+    """
+    deleted = set()
+    inserted = set()
+    offset = len(yv) + 1
+    size = len(xv) + len(yv) + 3
+    fd = [0] * size
+    bd = [0] * size
+    big = size + 1
+
+    pending = [(0, len(xv), 0, len(yv), minimal)]
+    while pending:
+        xoff, xlim, yoff, ylim, find_minimal = pending.pop()
+        n = _snake(xv, yv, xoff, yoff, xlim, ylim)
+        xoff += n
+        yoff += n
+        n = _snake_back(xv, yv, xlim, ylim, xoff, yoff)
+        xlim -= n
+        ylim -= n
+
+        if xoff == xlim:
+            inserted.update(range(yoff, ylim))
+            continue
+        if yoff == ylim:
+            deleted.update(range(xoff, xlim))
+            continue
+
+        # find the middle snake
+        dmin = xoff - ylim
+        dmax = xlim - yoff
+        fmid = xoff - yoff
+        bmid = xlim - ylim
+        fmin = fmax = fmid
+        bmin = bmax = bmid
+        odd = (fmid - bmid) & 1
+        fd[offset + fmid] = xoff
+        bd[offset + bmid] = xlim
+        cost = 0
+        mid = None
+        while mid is None:
+            cost += 1
+
+            # extend the forward search by an edit step in each diagonal
+            if fmin > dmin:
+                fmin -= 1
+                fd[offset + fmin - 1] = -1
+            else:
+                fmin += 1
+            if fmax < dmax:
+                fmax += 1
+                fd[offset + fmax + 1] = -1
+            else:
+                fmax -= 1
+            for d in range(fmax, fmin - 1, -2):
+                tlo = fd[offset + d - 1]
+                thi = fd[offset + d + 1]
+                x = thi if tlo < thi else tlo + 1
+                y = x - d
+                if x < xlim and y < ylim and xv[x] == yv[y]:
+                    n = _snake(xv, yv, x, y, xlim, ylim)
+                    x += n
+                    y += n
+                fd[offset + d] = x
+                if odd and bmin <= d <= bmax and bd[offset + d] <= x:
+                    mid = (x, y, True, True)
+                    break
+            if mid:
+                break
+
+            # and likewise the backward search
+            if bmin > dmin:
+                bmin -= 1
+                bd[offset + bmin - 1] = big
+            else:
+                bmin += 1
+            if bmax < dmax:
+                bmax += 1
+                bd[offset + bmax + 1] = big
+            else:
+                bmax -= 1
+            for d in range(bmax, bmin - 1, -2):
+                tlo = bd[offset + d - 1]
+                thi = bd[offset + d + 1]
+                x = tlo if tlo < thi else thi - 1
+                y = x - d
+                if xoff < x and yoff < y and xv[x - 1] == yv[y - 1]:
+                    n = _snake_back(xv, yv, x, y, xoff, yoff)
+                    x -= n
+                    y -= n
+                bd[offset + d] = x
+                if not odd and fmin <= d <= fmax and x <= fd[offset + d]:
+                    mid = (x, y, True, True)
+                    break
+            if mid or find_minimal or cost < too_expensive:
+                continue
+
+            # this is too expensive; give up and use whichever of the forward
+            # and backward searches has made the most progress
+            fxybest = -1
+            for d in range(fmax, fmin - 1, -2):
+                x = min(fd[offset + d], xlim)
+                y = x - d
+                if ylim < y:
+                    x = ylim + d
+                    y = ylim
+                if fxybest < x + y:
+                    fxybest = x + y
+                    fxbest = x
+            bxybest = big * 2
+            for d in range(bmax, bmin - 1, -2):
+                x = max(xoff, bd[offset + d])
+                y = x - d
+                if y < yoff:
+                    x = yoff + d
+                    y = yoff
+                if x + y < bxybest:
+                    bxybest = x + y
+                    bxbest = x
+            if (xlim + ylim) - bxybest < fxybest - (xoff + yoff):
+                mid = (fxbest, fxybest - fxbest, True, False)
+            else:
+                mid = (bxbest, bxybest - bxbest, False, True)
+
+        xmid, ymid, lo_minimal, hi_minimal = mid
+        pending.append((xmid, xlim, ymid, ylim, hi_minimal))
+        pending.append((xoff, xmid, yoff, ymid, lo_minimal))
+    return deleted, inserted
+
+
+def _shift_boundaries(equivs, changed, other_changed):
+    """
+    Slide each run of changed lines in one file as far forward as possible
+    where the lines moved over are identical, merging runs where that is
+    possible, and then back to align with a run of changes in the other file.
+    The `changed` lists have an extra unchanged element at each end, so line
+    `i` is at index `i + 1`.
+    """
+    c = changed
+    o = other_changed
+    i = j = 0
+    i_end = len(equivs)
+    # the unchanged lines of the other file, which does not change here
+    unchanged = [k for k, x in enumerate(o[1:]) if not x]
+    while True:
+        # skip to the next run of changes, moving j just past the line in the
+        # other file corresponding to the last unchanged line skipped
+        if i < i_end and not c[i + 1]:
+            try:
+                skip = c.index(1, i + 1) - 1 - i
+            except ValueError:
+                skip = i_end - i
+            j = unchanged[bisect_left(unchanged, j) + skip - 1] + 1
+            i += skip
+        if i == i_end:
+            break
+
+        start = i
+        i += 1
+        while c[i + 1]:
+            i += 1
+        while o[j + 1]:
+            j += 1
+
+        while True:
+            runlength = i - start
+
+            # move the run back while the previous unchanged line matches the
+            # last changed one, merging with previous runs
+            while start and equivs[start - 1] == equivs[i - 1]:
+                start -= 1
+                c[start + 1] = 1
+                i -= 1
+                c[i + 1] = 0
+                while c[start]:
+                    start -= 1
+                while True:
+                    j -= 1
+                    if not o[j + 1]:
+                        break
+
+            # the end of the run, at the last point where it corresponds to a
+            # run of changes in the other file
+            corresponding = i if o[j] else i_end
+
+            # move the run forward while the first changed line matches the
+            # following unchanged one, merging with following runs
+            while i != i_end and equivs[start] == equivs[i]:
+                c[start + 1] = 0
+                start += 1
+                c[i + 1] = 1
+                i += 1
+                while c[i + 1]:
+                    i += 1
+                while True:
+                    j += 1
+                    if not o[j + 1]:
+                        break
+                    corresponding = i
+
+            if runlength == i - start:
+                break
+
+        # move the merged run back to a corresponding run in the other file
+        while corresponding < i:
+            start -= 1
+            c[start + 1] = 1
+            i -= 1
+            c[i + 1] = 0
+            while True:
+                j -= 1
+                if not o[j + 1]:
+                    break
+
+
+def _changes(a, b, horizon, minimal):
+    """
+    Return a list of (line0, line1, deleted, inserted) for each change between
+    files a and b.
+    """
+    prefix, suffix = _identical_ends(a, b, horizon)
+    keys0 = a.keys[prefix:len(a.keys) - suffix]
+    keys1 = b.keys[prefix:len(b.keys) - suffix]
+
+    classes = {k: i for i, k in enumerate(dict.fromkeys(keys0 + keys1))}
+    equivs0 = list(map(classes.__getitem__, keys0))
+    equivs1 = list(map(classes.__getitem__, keys1))
+    counts0 = Counter(equivs0)
+    counts1 = Counter(equivs1)
+
+    if minimal:
+        changed0 = [0] * (len(equivs0) + 2)
+        changed1 = [0] * (len(equivs1) + 2)
+    else:
+        discards0 = _discard_confusing_lines(equivs0, counts1)
+        discards1 = _discard_confusing_lines(equivs1, counts0)
+        changed0 = [0] + discards0 + [0]
+        changed1 = [0] + discards1 + [0]
+    kept0 = [i for i, d in enumerate(changed0[1:-1]) if not d]
+    kept1 = [i for i, d in enumerate(changed1[1:-1]) if not d]
+
+    # roughly the square root of the input size, but at least 4096
+    diags = len(kept0) + len(kept1) + 3
+    too_expensive = 1
+    while diags:
+        diags >>= 2
+        too_expensive <<= 1
+    too_expensive = max(4096, too_expensive)
+
+    deleted, inserted = _compareseq(
+        [equivs0[i] for i in kept0],
+        [equivs1[i] for i in kept1],
+        minimal,
+        too_expensive,
+    )
+    for x in deleted:
+        changed0[kept0[x] + 1] = 1
+    for y in inserted:
+        changed1[kept1[y] + 1] = 1
+
+    _shift_boundaries(equivs0, changed0, changed1)
+    _shift_boundaries(equivs1, changed1, changed0)
+
+    # pair up the runs of changed lines in each file by the number of
+    # unchanged lines before them
+    runs0 = _runs(changed0)
+    runs1 = _runs(changed1)
+    changes = []
+    i = j = 0
+    changed_before0 = changed_before1 = 0
+    while i < len(runs0) or j < len(runs1):
+        u0 = runs0[i][0] if i < len(runs0) else len(equivs0) + 1
+        u1 = runs1[j][0] if j < len(runs1) else len(equivs1) + 1
+        unchanged = min(u0, u1)
+        deleted = runs0[i][1] if u0 == unchanged else 0
+        inserted = runs1[j][1] if u1 == unchanged else 0
+        changes.append(
+            (
+                prefix + unchanged + changed_before0,
+                prefix + unchanged + changed_before1,
+                deleted,
+                inserted,
+            )
+        )
+        if deleted:
+            i += 1
+            changed_before0 += deleted
+        if inserted:
+            j += 1
+            changed_before1 += inserted
+    return changes
+
+
+def _runs(changed):
+    """
+    Return (unchanged lines before, length) for each run of changed lines in a
+    `changed` list as used by `_shift_boundaries`.
+    """
+    runs = []
+    count = 0
+    end = -1
+    for i in compress(range(len(changed) - 2), changed[1:-1]):
+        if i == end:
+            runs[-1][1] += 1
+        else:
+            runs.append([i - count, 1])
+        count += 1
+        end = i + 1
+    return runs
+
+
+def _range(first, last):
+    "format a range of (0-based) line numbers for a hunk header"
+    if last < first:
+        return "{},0".format(last + 1)
+    if last == first:
+        return "{}".format(first + 1)
+    return "{},{}".format(first + 1, last - first + 1)
+
+
+def unified_diff(left, right, context=3, labels=("a", "b"), minimal=False):
+    """
+    Compare lists of lines `left` and `right`, each treated as the contents of
+    a file with the lines separated by newlines (so with no newline after the
+    last line), returning the output of `diff -U<context> --label <label> ..`
+    as a string.  With `minimal`, this is the output of `diff --minimal`.  If
+    `labels` is None, the `---` and `+++` lines are omitted.
+
+    Large inputs are compared by running `diff` itself, if it is installed;
+    otherwise they are compared in-process, which may take some seconds.
+    """
+    if len(left) + len(right) > LARGE_DIFF_LINES and shutil.which("diff"):
+        return _gnu_unified_diff(left, right, context, labels, minimal)
+    a = _File(left)
+    b = _File(right)
+    if a.keys == b.keys:
+        return ""
+    changes = _changes(a, b, context, minimal)
+
+    out = []
+    if labels is not None:
+        out.extend(["--- {}".format(labels[0]), "+++ {}".format(labels[1])])
+
+    def line(prefix, file, i):
+        out.append(prefix + file.lines[i])
+        if file.missing_newline and i == len(file.lines) - 1:
+            out.append(NO_NEWLINE)
+
+    h = 0
+    while h < len(changes):
+        # gather the changes separated by no more than 2 * context lines
+        e = h
+        while (
+            e + 1 < len(changes)
+            and changes[e + 1][0] - (changes[e][0] + changes[e][2]) < 2 * context + 1
+        ):
+            e += 1
+        hunk = changes[h:e + 1]
+        h = e + 1
+
+        first0 = max(hunk[0][0] - context, 0)
+        first1 = max(hunk[0][1] - context, 0)
+        last0 = min(hunk[-1][0] + hunk[-1][2] - 1 + context, len(a.lines) - 1)
+        last1 = min(hunk[-1][1] + hunk[-1][3] - 1 + context, len(b.lines) - 1)
+        out.append(
+            "@@ -{} +{} @@".format(_range(first0, last0), _range(first1, last1))
+        )
+
+        i, j = first0, first1
+        for line0, _, deleted, inserted in hunk:
+            while i < line0:
+                line(" ", a, i)
+                i += 1
+                j += 1
+            for _ in range(deleted):
+                line("-", a, i)
+                i += 1
+            for _ in range(inserted):
+                line("+", b, j)
+                j += 1
+        while i <= last0:
+            line(" ", a, i)
+            i += 1
+            j += 1
+
+    return "\n".join(out) + "\n"
+
+
+def _gnu_unified_diff(left, right, context, labels, minimal):
+    "Produce the output of `unified_diff` by running `diff`"
+    with NamedTemporaryFile("w") as left_file, NamedTemporaryFile("w") as right_file:
+        left_file.write("\n".join(left))
+        left_file.flush()
+
+        right_file.write("\n".join(right))
+        right_file.flush()
+
+        args = ["diff", "-U{}".format(context)]
+        for label in labels or ("a", "b"):
+            args.extend(["--label", label])
+        if minimal:
+            args.append("--minimal")
+        args.extend([left_file.name, right_file.name])
+
+        output = subprocess.run(args, encoding="utf8", stdout=subprocess.PIPE).stdout
+    if labels is None and output:
+        output = output.split("\n", 2)[2]
+    return output